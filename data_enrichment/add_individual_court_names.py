@@ -22,6 +22,7 @@ class IndividualCourtNameManager:
     
     def __init__(self, connection_string: str):
         self.connection_string = connection_string
+        self._conn = None
         
         logger.info(json.dumps({
             'event': 'individual_court_name_manager_initialized',
@@ -29,8 +30,16 @@ class IndividualCourtNameManager:
         }))
     
     def get_connection(self):
-        """Get database connection"""
-        return psycopg2.connect(self.connection_string)
+        """Get the manager's database connection, opening it on first use"""
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(self.connection_string)
+        return self._conn
+    
+    def close(self):
+        """Close database connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
     
     def verify_individual_court_name_column(self):
         """Verify individual_court_name column exists (should be created via migrations)"""
@@ -46,7 +55,11 @@ class IndividualCourtNameManager:
                 WHERE table_name = 'courts' AND column_name = 'individual_court_name'
             """)
             
-            if cursor.fetchone():
+            column_exists = cursor.fetchone() is not None
+            # End the read-only transaction so the shared connection isn't left idle in it
+            conn.commit()
+            
+            if column_exists:
                 logger.info(json.dumps({
                     'event': 'column_verified',
                     'column': 'individual_court_name'
@@ -65,10 +78,9 @@ class IndividualCourtNameManager:
                 'event': 'column_verification_error',
                 'error': str(e)
             }))
-            return False
-        finally:
             if conn:
-                conn.close()
+                conn.rollback()
+            return False
     
     def populate_individual_court_names(self) -> Dict[str, Any]:
         """
@@ -99,6 +111,8 @@ class IndividualCourtNameManager:
             
             # Use SQL window function to assign sequential names within each cluster
             # Only assigns names to clusters with more than 1 court
+            # Statistics are aggregated from the UPDATE's RETURNING rows in the same statement
+            # (each named cluster has exactly one "Court 1"), instead of re-scanning courts
             cursor.execute("""
                 WITH ranked_courts AS (
                     SELECT 
@@ -111,33 +125,23 @@ class IndividualCourtNameManager:
                         COUNT(*) OVER (PARTITION BY cluster_id) as cluster_size
                     FROM courts
                     WHERE cluster_id IS NOT NULL
+                ),
+                named_courts AS (
+                    UPDATE courts c
+                    SET individual_court_name = 'Court ' || rc.court_number::TEXT
+                    FROM ranked_courts rc
+                    WHERE c.id = rc.id
+                      AND rc.cluster_size > 1
+                    RETURNING rc.court_number, rc.cluster_size
                 )
-                UPDATE courts c
-                SET individual_court_name = 'Court ' || rc.court_number::TEXT
-                FROM ranked_courts rc
-                WHERE c.id = rc.id
-                  AND rc.cluster_size > 1;
-            """)
-            
-            updated_count = cursor.rowcount
-            
-            # Get statistics
-            cursor.execute("""
                 SELECT 
-                    COUNT(*) FILTER (WHERE individual_court_name IS NOT NULL) as courts_with_names,
-                    COUNT(DISTINCT cluster_id) FILTER (WHERE individual_court_name IS NOT NULL) as clusters_with_names,
+                    COUNT(*) as courts_with_names,
+                    COUNT(*) FILTER (WHERE court_number = 1) as clusters_with_names,
                     MAX(cluster_size) as largest_named_cluster
-                FROM (
-                    SELECT 
-                        cluster_id,
-                        individual_court_name,
-                        COUNT(*) OVER (PARTITION BY cluster_id) as cluster_size
-                    FROM courts
-                    WHERE cluster_id IS NOT NULL
-                ) named_clusters
-                WHERE individual_court_name IS NOT NULL
+                FROM named_courts;
             """)
             stats = cursor.fetchone()
+            updated_count = stats[0]
             
             conn.commit()
             
@@ -168,9 +172,6 @@ class IndividualCourtNameManager:
                 'clusters_with_names': 0,
                 'largest_named_cluster': 0
             }
-        finally:
-            if conn:
-                conn.close()
     
 def main():
     """Main function to add individual court names"""
@@ -189,16 +190,19 @@ def main():
     
     manager = IndividualCourtNameManager(connection_string)
     
-    # Step 1: Verify column exists (should be created via migrations)
-    print("1. Verifying individual_court_name column...")
-    if not manager.verify_individual_court_name_column():
-        print("   ❌ Column does not exist. Please run migrations first.")
-        return
-    print("   ✅ Column verified")
-    
-    # Step 2: Populate individual court names (database-side)
-    print("\n2. Populating individual court names (database-side SQL)...")
-    summary = manager.populate_individual_court_names()
+    try:
+        # Step 1: Verify column exists (should be created via migrations)
+        print("1. Verifying individual_court_name column...")
+        if not manager.verify_individual_court_name_column():
+            print("   ❌ Column does not exist. Please run migrations first.")
+            return
+        print("   ✅ Column verified")
+        
+        # Step 2: Populate individual court names (database-side)
+        print("\n2. Populating individual court names (database-side SQL)...")
+        summary = manager.populate_individual_court_names()
+    finally:
+        manager.close()
     print(f"   ✅ Updated {summary['updated_courts']} courts with individual names")
     print(f"   📊 Clusters with names: {summary['clusters_with_names']}")
     print(f"   📊 Largest named cluster: {summary['largest_named_cluster']} courts")
@@ -5,7 +5,8 @@ Groups nearby courts that likely belong to the same facility
 
 import json
 import logging
-import math
+import numpy as np
+import shapely
 from typing import Dict, Any, List, Tuple, Optional
 from dataclasses import dataclass
 
@@ -13,6 +14,121 @@ from dataclasses import dataclass
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fallback names by sport; sports not listed fall back to "<sport> court"
+FALLBACK_NAMES = {
+    'basketball': 'basketball court',
+    'tennis': 'tennis court',
+    'soccer': 'soccer field',
+    'volleyball': 'volleyball court',
+    'pickleball': 'pickleball court',
+}
+
+EARTH_RADIUS_KM = 6371.0
+
+def polygon_centroids(rings: List[np.ndarray]) -> np.ndarray:
+    """
+    Area-weighted centroids of many polygon rings in one vectorized pass (shoelace formula)
+    
+    Args:
+        rings: Exterior rings, each an (n, 2) array of [lon, lat] vertices (closed or open)
+    
+    Returns:
+        (len(rings), 2) array of [lon, lat] centroids; the vertex mean for degenerate (zero-area) rings
+    """
+    if not rings:
+        return np.empty((0, 2))
+    
+    lengths = np.fromiter((len(ring) for ring in rings), dtype=np.intp, count=len(rings))
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    starts = offsets[:-1]
+    coords = np.concatenate(rings)
+    
+    # Work relative to each ring's first vertex to keep the cross products well conditioned
+    origins = coords[starts]
+    local = coords - np.repeat(origins, lengths, axis=0)
+    x, y = local[:, 0], local[:, 1]
+    
+    # Index of each vertex's successor, wrapping the last vertex of a ring back to its first
+    successor = np.arange(1, len(coords) + 1)
+    successor[offsets[1:] - 1] = starts
+    x_next, y_next = x[successor], y[successor]
+    
+    cross = x * y_next - x_next * y
+    twice_area = np.add.reduceat(cross, starts)
+    centroids = np.add.reduceat(local, starts) / lengths[:, None]
+    
+    nondegenerate = twice_area != 0
+    weighted = np.column_stack((
+        np.add.reduceat((x + x_next) * cross, starts),
+        np.add.reduceat((y + y_next) * cross, starts),
+    ))
+    centroids[nondegenerate] = weighted[nondegenerate] / (3 * twice_area[nondegenerate, None])
+    
+    return centroids + origins
+
+def neighbor_pairs(lats: np.ndarray, lons: np.ndarray, max_distance_km: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    All (i, j) index pairs of points within max_distance_km of each other, using an R-tree
+    
+    Each point's search box is queried against an STRtree of all points, so only nearby
+    candidates get a distance check instead of every pair. The check uses an equirectangular
+    approximation, which at court-clustering distances (tens of meters) agrees with Haversine
+    to well under a millimeter.
+    
+    Args:
+        lats: Latitudes in degrees
+        lons: Longitudes in degrees
+        max_distance_km: Distance threshold in kilometers
+    
+    Returns:
+        (i, j) index arrays sorted by i then j; every point is paired with itself
+    """
+    tree = shapely.STRtree(shapely.points(lons, lats))
+    
+    # Half-widths of each point's search box in degrees, padded slightly so the box always covers the circle
+    cos_lats = np.cos(np.radians(lats))
+    lat_window = np.degrees(max_distance_km / EARTH_RADIUS_KM) * 1.01
+    lon_window = lat_window / np.maximum(cos_lats, 1e-6)
+    boxes = shapely.box(lons - lon_window, lats - lat_window, lons + lon_window, lats + lat_window)
+    
+    i, j = tree.query(boxes)
+    
+    # Squared equirectangular distance in degrees, scaled by the pair's mean cos(lat);
+    # no trig or sqrt per pair
+    dy = lats[j] - lats[i]
+    dx = (lons[j] - lons[i]) * ((cos_lats[i] + cos_lats[j]) / 2)
+    max_distance_deg = np.degrees(max_distance_km / EARTH_RADIUS_KM)
+    within = dx * dx + dy * dy <= max_distance_deg * max_distance_deg
+    i, j = i[within], j[within]
+    
+    order = np.lexsort((j, i))
+    return i[order], j[order]
+
+class DisjointSet:
+    """Union-find over 0..n-1 with union by size and path halving"""
+    
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+    
+    def find(self, x: int) -> int:
+        """Root of x's set"""
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    
+    def union(self, a: int, b: int):
+        """Merge the sets containing a and b, attaching the smaller tree under the larger"""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+
 @dataclass
 class CourtClusterData:
     """Data structure for court clustering"""
@@ -46,31 +162,51 @@ class CoordinateClusterer:
     def extract_court_data(self, features: List[Dict[str, Any]]) -> List[CourtClusterData]:
         """Extract court data from GeoJSON features for clustering"""
         courts = []
+        polygon_features = []
+        rings = []
         
+        # Collect polygon rings first so all centroids are computed in one NumPy pass
         for i, feature in enumerate(features):
             try:
-                properties = feature['properties']
                 geometry = feature['geometry']
-                
-                # Extract coordinates (centroid of polygon)
                 if geometry['type'] == 'Polygon' and geometry['coordinates']:
-                    ring = geometry['coordinates'][0]
-                    total_lon = sum(coord[0] for coord in ring) / len(ring)
-                    total_lat = sum(coord[1] for coord in ring) / len(ring)
-                    
-                    court = CourtClusterData(
-                        osm_id=properties.get('osm_id') or properties.get('@id'),
-                        lat=total_lat,
-                        lon=total_lon,
-                        sport=properties.get('sport', 'basketball'),
-                        hoops=int(properties.get('hoops')) if properties.get('hoops') else None,
-                        fallback_name=self._generate_fallback_name(properties),
-                        feature_index=i,
-                        feature_data=feature
-                    )
-                    
-                    courts.append(court)
-                    
+                    ring = np.asarray(geometry['coordinates'][0], dtype=np.float64)
+                    # Reject malformed rings here so one bad feature is skipped instead of
+                    # breaking the vectorized centroid pass for the whole collection
+                    if ring.ndim != 2 or ring.shape[1] < 2 or len(ring) < 4:
+                        raise ValueError(f"Invalid polygon ring with shape {ring.shape}")
+                    rings.append(ring[:, :2])
+                    polygon_features.append((i, feature))
+            except Exception as e:
+                logger.error(json.dumps({
+                    'event': 'court_data_extraction_error',
+                    'feature_index': i,
+                    'error': str(e)
+                }))
+        
+        centroids = polygon_centroids(rings)
+        
+        for (i, feature), (total_lon, total_lat) in zip(polygon_features, centroids.tolist()):
+            try:
+                # Parse sport/hoops once; the fallback name is built from the parsed values
+                properties = feature['properties']
+                sport = properties.get('sport', 'basketball')
+                hoops = properties.get('hoops')
+                hoops = int(hoops) if hoops else None
+                
+                court = CourtClusterData(
+                    osm_id=properties.get('osm_id') or properties.get('@id'),
+                    lat=total_lat,
+                    lon=total_lon,
+                    sport=sport,
+                    hoops=hoops,
+                    fallback_name=self._generate_fallback_name(sport, hoops),
+                    feature_index=i,
+                    feature_data=feature
+                )
+                
+                courts.append(court)
+                
             except Exception as e:
                 logger.error(json.dumps({
                     'event': 'court_data_extraction_error',
@@ -91,47 +227,51 @@ class CoordinateClusterer:
         """
         Cluster nearby courts together for consistent naming
         
+        Clusters are connected components: courts of the same sport join one cluster
+        whenever a chain of courts links them, each step within max_distance_km.
+        
         Returns:
             List of clusters, where each cluster is a list of CourtClusterData
+            (ordered by first member; the first court in each cluster is its representative)
         """
         clusters = []
-        processed = set()
+        lats = np.array([court.lat for court in courts], dtype=np.float64)
+        lons = np.array([court.lon for court in courts], dtype=np.float64)
+        # Integer sport codes so the same-sport mask is a numeric compare rather than object ==
+        codes = {}
+        sport_codes = np.fromiter((codes.setdefault(court.sport, len(codes)) for court in courts),
+                                  dtype=np.intp, count=len(courts))
         
-        for i, court in enumerate(courts):
-            if i in processed:
-                continue
-                
-            # Start a new cluster with this court
-            cluster = [court]
-            processed.add(i)
-            
-            # Find all other unprocessed courts within the distance threshold
-            # Check ALL courts, not just those after the current one
-            for j, other_court in enumerate(courts):
-                if j in processed or j == i:
-                    continue
-                    
-                distance = self._calculate_distance(
-                    court.lat, court.lon,
-                    other_court.lat, other_court.lon
-                )
-                
-                # Only cluster courts of the same sport
-                if distance <= self.max_distance_km and court.sport == other_court.sport:
-                    cluster.append(other_court)
-                    processed.add(j)
+        # Spatial index lookup gives every nearby pair; union same-sport pairs (each once, i < j)
+        seeds, candidates = neighbor_pairs(lats, lons, self.max_distance_km)
+        edges = (seeds < candidates) & (sport_codes[seeds] == sport_codes[candidates])
+        components = DisjointSet(len(courts))
+        for i, j in zip(seeds[edges].tolist(), candidates[edges].tolist()):
+            components.union(i, j)
+        
+        members_by_root = {}
+        for i in range(len(courts)):
+            members_by_root.setdefault(components.find(i), []).append(i)
+        
+        # One event per cluster: only build and serialize it if INFO is actually enabled
+        log_clusters = logger.isEnabledFor(logging.INFO)
+        
+        for members in members_by_root.values():
+            court = courts[members[0]]
+            cluster = [courts[j] for j in members]
             
             clusters.append(cluster)
             
-            logger.info(json.dumps({
-                'event': 'cluster_created',
-                'cluster_id': len(clusters),
-                'cluster_size': len(cluster),
-                'sport': court.sport,
-                'representative_osm_id': court.osm_id,
-                'coordinates': {'lat': court.lat, 'lon': court.lon},
-                'max_distance_km': self.max_distance_km
-            }))
+            if log_clusters:
+                logger.info(json.dumps({
+                    'event': 'cluster_created',
+                    'cluster_id': len(clusters),
+                    'cluster_size': len(cluster),
+                    'sport': court.sport,
+                    'representative_osm_id': court.osm_id,
+                    'coordinates': {'lat': court.lat, 'lon': court.lon},
+                    'max_distance_km': self.max_distance_km
+                }))
         
         # Log clustering summary
         total_courts = len(courts)
@@ -148,51 +288,13 @@ class CoordinateClusterer:
         
         return clusters
     
-    def _calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calculate distance between two coordinates using Haversine formula (returns km)"""
-        R = 6371.0  # Earth's radius in kilometers
+    def _generate_fallback_name(self, sport: str, hoops: Optional[int]) -> str:
+        """Generate fallback name from a court's parsed sport and hoops count"""
+        if sport == 'basketball' and hoops:
+            return f"basketball court ({hoops} hoops)"
         
-        lat1_rad = math.radians(lat1)
-        lon1_rad = math.radians(lon1)
-        lat2_rad = math.radians(lat2)
-        lon2_rad = math.radians(lon2)
-        
-        dlat = lat2_rad - lat1_rad
-        dlon = lon2_rad - lon1_rad
-        
-        a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        
-        return R * c
-    
-    def _generate_fallback_name(self, properties: Dict[str, Any]) -> str:
-        """Generate fallback name from OSM properties"""
-        try:
-            sport = properties.get('sport', 'basketball')
-            hoops = properties.get('hoops')
-            
-            if sport == 'basketball' and hoops:
-                hoops_int = int(hoops) if isinstance(hoops, str) else hoops
-                return f"basketball court ({hoops_int} hoops)"
-            elif sport == 'basketball':
-                return "basketball court"
-            elif sport == 'tennis':
-                return "tennis court"
-            elif sport == 'soccer':
-                return "soccer field"
-            elif sport == 'volleyball':
-                return "volleyball court"
-            elif sport == 'pickleball':
-                return "pickleball court"
-            else:
-                return f"{sport} court"
-                
-        except Exception as e:
-            logger.warning(json.dumps({
-                'event': 'fallback_name_generation_error',
-                'error': str(e)
-            }))
-            return "sports court"
+        fallback_name = FALLBACK_NAMES.get(sport)
+        return fallback_name if fallback_name is not None else f"{sport} court"
 
 # Example usage
 if __name__ == "__main__":
@@ -8,8 +8,8 @@ import json
 import logging
 import os
 import sys
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool
 from typing import Dict, Any
 
 # Configure logging
@@ -21,295 +21,327 @@ class ClusterMetadataPopulator:
     
     def __init__(self, connection_string: str):
         self.connection_string = connection_string
+        # Connections are reused across populate/transfer calls instead of reconnecting each time
+        self.pool = ThreadedConnectionPool(1, 4, connection_string)
         
         logger.info(json.dumps({
             'event': 'cluster_metadata_populator_initialized',
             'method': 'database_sql'
         }))
     
+    @contextmanager
     def get_connection(self):
-        """Get database connection"""
-        return psycopg2.connect(self.connection_string)
+        """Borrow a pooled database connection, returning it to the pool afterwards"""
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        finally:
+            self.pool.putconn(conn)
     
-    def populate_cluster_metadata(self) -> Dict[str, Any]:
+    @contextmanager
+    def session(self):
+        """
+        Hold one pooled connection across several calls as a single transaction
+        
+        Pass the yielded connection as `conn` to the populate/transfer methods; the
+        transaction commits when the block exits and rolls back if it raises.
+        """
+        with self.get_connection() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    @contextmanager
+    def _transaction(self, conn=None):
+        """Use the caller's session connection if given, else run in a transaction of our own"""
+        if conn is not None:
+            yield conn
+        else:
+            with self.session() as conn:
+                yield conn
+    
+    def close(self):
+        """Close all pooled database connections"""
+        self.pool.closeall()
+    
+    def populate_cluster_metadata(self, conn=None) -> Dict[str, Any]:
         """
         Populate cluster_id for courts based on facility_name and sport
         Uses SQL to efficiently group and assign UUIDs in the database
+        
+        Args:
+            conn: Connection from session() to run inside the caller's transaction (default: own transaction)
         """
-        conn = None
+        logger.info(json.dumps({
+            'event': 'cluster_metadata_population_started',
+            'method': 'sql_based'
+        }))
+        
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            logger.info(json.dumps({
-                'event': 'cluster_metadata_population_started',
-                'method': 'sql_based'
-            }))
-            
-            # Step 1: Get statistics before clustering
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_courts,
-                    COUNT(DISTINCT facility_name) as unique_facilities,
-                    COUNT(DISTINCT (facility_name, sport)) as unique_facility_sport_combos,
-                    COUNT(*) FILTER (WHERE facility_name IS NOT NULL) as courts_with_facility
-                FROM osm_courts_temp;
-            """)
-            stats_before = cursor.fetchone()
-            
-            # Step 2: Assign cluster_id based on effective facility_name AND sport using SQL
-            # Use court's own OSM name if available, else use containing facility name
-            # This creates a UUID for each unique (effective_facility_name, sport) combination
-            cursor.execute("""
-                WITH facility_sport_clusters AS (
-                    SELECT DISTINCT 
-                        COALESCE(NULLIF(tags->>'name', ''), facility_name) as effective_facility_name,
-                        sport,
-                        gen_random_uuid() as cluster_id
-                    FROM osm_courts_temp
-                    WHERE COALESCE(NULLIF(tags->>'name', ''), facility_name) IS NOT NULL
-                      AND sport IS NOT NULL
-                )
-                UPDATE osm_courts_temp oc
-                SET cluster_id = fsc.cluster_id
-                FROM facility_sport_clusters fsc
-                WHERE COALESCE(NULLIF(oc.tags->>'name', ''), oc.facility_name) = fsc.effective_facility_name
-                  AND oc.sport = fsc.sport
-                  AND COALESCE(NULLIF(oc.tags->>'name', ''), oc.facility_name) IS NOT NULL
-                  AND oc.sport IS NOT NULL;
-            """)
-            
-            updated_count = cursor.rowcount
-            
-            # Step 3: Get statistics after clustering
-            cursor.execute("""
-                SELECT 
-                    COUNT(DISTINCT cluster_id) as total_clusters,
-                    COUNT(*) FILTER (WHERE cluster_id IS NOT NULL) as courts_with_cluster,
-                    MAX(cluster_size) as largest_cluster_size
-                FROM (
+            with self._transaction(conn) as conn:
+                cursor = conn.cursor()
+                
+                # Gather stats, assign cluster_id and summarize the clusters in one round-trip.
+                # cluster_id is based on effective facility_name AND sport: the court's own OSM
+                # name if available, else the containing facility name. The UUID is derived from
+                # that key plus a locality component - the geohash (~1 km cell) of the cluster's
+                # centroid - so re-runs keep the same IDs and rows that already carry the right
+                # ID are not rewritten, while same-named facilities clustered in other regions
+                # or runs never share an ID (user renames are applied by cluster_id). Cluster
+                # stats come from the same key groups rather than from the UPDATE's output
+                # (which only holds the rows that changed).
+                cursor.execute("""
+                    WITH facility_sport_counts AS (
+                        -- One hash aggregate over the table; the distinct counts below then
+                        -- work on these few groups instead of sorting every row
+                        SELECT facility_name, sport, COUNT(*) as court_count
+                        FROM osm_courts_temp
+                        GROUP BY facility_name, sport
+                    ),
+                    stats_before AS (
+                        SELECT 
+                            COALESCE(SUM(court_count), 0)::bigint as total_courts,
+                            COUNT(DISTINCT facility_name) as unique_facilities,
+                            COUNT(*) as unique_facility_sport_combos,
+                            COALESCE(SUM(court_count) FILTER (WHERE facility_name IS NOT NULL), 0)::bigint as courts_with_facility
+                        FROM facility_sport_counts
+                    ),
+                    cluster_sizes AS (
+                        SELECT 
+                            effective_facility_name,
+                            sport,
+                            md5(
+                                effective_facility_name || '|' || sport || '|' ||
+                                COALESCE(ST_GeoHash(ST_Centroid(ST_Collect(centroid)), 6), '')
+                            )::uuid as cluster_id,
+                            COUNT(*) as cluster_size
+                        FROM osm_courts_temp
+                        WHERE effective_facility_name IS NOT NULL
+                          AND sport IS NOT NULL
+                        GROUP BY effective_facility_name, sport
+                    ),
+                    updated AS (
+                        UPDATE osm_courts_temp oc
+                        SET cluster_id = cs.cluster_id
+                        FROM cluster_sizes cs
+                        WHERE oc.effective_facility_name = cs.effective_facility_name
+                          AND oc.sport = cs.sport
+                          AND oc.cluster_id IS DISTINCT FROM cs.cluster_id
+                        RETURNING 1
+                    )
                     SELECT 
-                        cluster_id,
-                        COUNT(*) OVER (PARTITION BY cluster_id) as cluster_size
-                    FROM osm_courts_temp
-                    WHERE cluster_id IS NOT NULL
-                ) cluster_stats;
-            """)
-            stats_after = cursor.fetchone()
-            
-            # Step 4: Get multi-court cluster count
-            cursor.execute("""
-                SELECT COUNT(*) as multi_court_clusters
-                FROM (
-                    SELECT cluster_id, COUNT(*) as court_count
-                    FROM osm_courts_temp
-                    WHERE cluster_id IS NOT NULL
-                    GROUP BY cluster_id
-                    HAVING COUNT(*) > 1
-                ) multi_clusters;
-            """)
-            multi_cluster_stats = cursor.fetchone()
-            
-            conn.commit()
-            
-            summary = {
-                'total_courts': stats_before['total_courts'],
-                'unique_facilities': stats_before['unique_facilities'],
-                'unique_facility_sport_combos': stats_before['unique_facility_sport_combos'],
-                'courts_with_facility': stats_before['courts_with_facility'],
-                'updated_courts': updated_count,
-                'total_clusters': stats_after['total_clusters'] or 0,
-                'courts_with_cluster': stats_after['courts_with_cluster'] or 0,
-                'multi_court_clusters': multi_cluster_stats['multi_court_clusters'] or 0,
-                'largest_cluster_size': stats_after['largest_cluster_size'] or 0
-            }
-            
-            logger.info(json.dumps({
-                'event': 'cluster_metadata_population_completed',
-                'summary': summary
-            }))
-            
-            return summary
-            
+                        b.total_courts,
+                        b.unique_facilities,
+                        b.unique_facility_sport_combos,
+                        b.courts_with_facility,
+                        (SELECT COUNT(*) FROM updated) as updated_courts,
+                        c.total_clusters,
+                        c.courts_with_cluster,
+                        c.multi_court_clusters,
+                        c.largest_cluster_size
+                    FROM stats_before b,
+                    (
+                        SELECT 
+                            COUNT(*) as total_clusters,
+                            COALESCE(SUM(cluster_size), 0)::bigint as courts_with_cluster,
+                            COUNT(*) FILTER (WHERE cluster_size > 1) as multi_court_clusters,
+                            MAX(cluster_size) as largest_cluster_size
+                        FROM cluster_sizes
+                    ) c;
+                """)
+                (total_courts, unique_facilities, unique_facility_sport_combos, courts_with_facility,
+                 updated_count, total_clusters, courts_with_cluster, multi_court_clusters,
+                 largest_cluster_size) = cursor.fetchone()
+                
+                summary = {
+                    'total_courts': total_courts,
+                    'unique_facilities': unique_facilities,
+                    'unique_facility_sport_combos': unique_facility_sport_combos,
+                    'courts_with_facility': courts_with_facility,
+                    'updated_courts': updated_count,
+                    'total_clusters': total_clusters or 0,
+                    'courts_with_cluster': courts_with_cluster or 0,
+                    'multi_court_clusters': multi_court_clusters or 0,
+                    'largest_cluster_size': largest_cluster_size or 0
+                }
+        
         except Exception as e:
-            if conn:
-                conn.rollback()
             logger.error(json.dumps({
                 'event': 'cluster_metadata_population_error',
                 'error': str(e)
             }))
             raise
-        finally:
-            if conn:
-                conn.close()
+        
+        logger.info(json.dumps({
+            'event': 'cluster_metadata_population_completed',
+            'summary': summary
+        }))
+        
+        return summary
     
-    def transfer_courts_to_production(self, region: str = 'sf_bay') -> Dict[str, Any]:
+    def transfer_courts_to_production(self, region: str = 'sf_bay', conn=None) -> Dict[str, Any]:
         """
         Transfer courts from osm_courts_temp to courts table
         Inserts new courts or updates existing ones by osm_id
         
         Args:
             region: Region identifier (default: 'sf_bay')
+            conn: Connection from session() to run inside the caller's transaction (default: own transaction)
         """
-        conn = None
+        logger.info(json.dumps({
+            'event': 'courts_transfer_started',
+            'source_table': 'osm_courts_temp',
+            'target_table': 'courts'
+        }))
+        
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            logger.info(json.dumps({
-                'event': 'courts_transfer_started',
-                'source_table': 'osm_courts_temp',
-                'target_table': 'courts'
-            }))
-            
-            # Insert/update courts from staging to production table
-            cursor.execute("""
-                INSERT INTO courts (
-                    osm_id, sport, geom, centroid, fallback_name, 
-                    surface_type, cluster_id, facility_name, hoops, region, school, is_public, has_lights
-                )
-                SELECT 
-                    oc.osm_id,
-                    oc.sport::sport_type,
-                    oc.geom,
-                    oc.centroid::geography,
-                    -- Generic sport-based fallback name
-                    CASE 
-                        WHEN oc.sport = 'basketball' AND oc.tags->>'hoops' ~ '^[0-9]+$'
-                        THEN 'basketball court (' || (oc.tags->>'hoops')::integer || ' hoops)'
-                        WHEN oc.sport = 'basketball'
-                        THEN 'basketball court'
-                        WHEN oc.sport = 'tennis'
-                        THEN 'tennis court'
-                        WHEN oc.sport = 'soccer'
-                        THEN 'soccer field'
-                        WHEN oc.sport = 'volleyball'
-                        THEN 'volleyball court'
-                        WHEN oc.sport = 'pickleball'
-                        THEN 'pickleball court'
-                        ELSE oc.sport || ' court'
-                    END as fallback_name,
-                    CASE 
-                        WHEN oc.tags->>'surface' IN ('asphalt', 'concrete', 'wood', 'synthetic', 'clay', 'grass') 
-                        THEN (oc.tags->>'surface')::surface_type_enum
-                        ELSE NULL
-                    END as surface_type,
-                    oc.cluster_id,
-                    -- Use court's own OSM name as facility_name if available, else use containing facility
-                    COALESCE(NULLIF(oc.tags->>'name', ''), oc.facility_name) as facility_name,
-                    CASE 
-                        WHEN oc.tags->>'hoops' ~ '^[0-9]+$' 
-                        THEN (oc.tags->>'hoops')::integer
-                        ELSE NULL
-                    END as hoops,
-                    %s as region,
-                    CASE 
-                        WHEN EXISTS (
-                            SELECT 1 FROM osm_facilities ofac
-                            WHERE ofac.id = oc.facility_id
-                            AND ofac.facility_type IN ('school', 'university', 'college')
-                        ) THEN true
-                        ELSE false
-                    END as school,
-                    -- Extract access tag from OSM: public/yes = true, private/no = false, else NULL
-                    CASE 
-                        WHEN LOWER(oc.tags->>'access') IN ('public', 'yes') THEN true
-                        WHEN LOWER(oc.tags->>'access') IN ('private', 'no') THEN false
-                        ELSE NULL
-                    END as is_public,
-                    -- Extract lit tag from OSM: yes = true, no = false, else NULL
-                    CASE 
-                        WHEN LOWER(oc.tags->>'lit') = 'yes' THEN true
-                        WHEN LOWER(oc.tags->>'lit') = 'no' THEN false
-                        ELSE NULL
-                    END as has_lights
-                FROM osm_courts_temp oc
-                ON CONFLICT (osm_id) DO UPDATE SET
-                    sport = EXCLUDED.sport,
-                    geom = EXCLUDED.geom,
-                    centroid = EXCLUDED.centroid,
-                    fallback_name = EXCLUDED.fallback_name,
-                    surface_type = EXCLUDED.surface_type,
-                    cluster_id = EXCLUDED.cluster_id,
-                    facility_name = EXCLUDED.facility_name,
-                    hoops = EXCLUDED.hoops,
-                    school = EXCLUDED.school,
-                    is_public = EXCLUDED.is_public,
-                    has_lights = EXCLUDED.has_lights,
-                    updated_at = NOW();
-            """, (region,))
-            
-            inserted_count = cursor.rowcount
-            
-            conn.commit()
-            
-            logger.info(json.dumps({
-                'event': 'courts_transfer_completed',
-                'inserted_or_updated_courts': inserted_count
-            }))
-            
-            return {'inserted_or_updated_courts': inserted_count}
-            
+            with self._transaction(conn) as conn:
+                cursor = conn.cursor()
+                
+                # Insert/update courts from staging to production table
+                cursor.execute("""
+                    INSERT INTO courts (
+                        osm_id, sport, geom, centroid, fallback_name, 
+                        surface_type, cluster_id, facility_name, hoops, region, school, is_public, has_lights
+                    )
+                    SELECT 
+                        oc.osm_id,
+                        oc.sport::sport_type,
+                        oc.geom,
+                        oc.centroid::geography,
+                        -- Generic sport-based fallback name
+                        CASE 
+                            WHEN oc.sport = 'basketball' AND oc.hoops IS NOT NULL
+                            THEN 'basketball court (' || oc.hoops || ' hoops)'
+                            ELSE COALESCE(fallback.name, oc.sport || ' court')
+                        END as fallback_name,
+                        CASE 
+                            WHEN oc.surface IN ('asphalt', 'concrete', 'wood', 'synthetic', 'clay', 'grass') 
+                            THEN oc.surface::surface_type_enum
+                            ELSE NULL
+                        END as surface_type,
+                        -- Assigned by populate_cluster_metadata (run first, in the same session)
+                        oc.cluster_id,
+                        -- Use court's own OSM name as facility_name if available, else use containing facility
+                        oc.effective_facility_name as facility_name,
+                        oc.hoops,
+                        %s as region,
+                        (school_fac.id IS NOT NULL) as school,
+                        -- Extract access tag from OSM: public/yes = true, private/no = false, else NULL
+                        CASE 
+                            WHEN oc.access IN ('public', 'yes') THEN true
+                            WHEN oc.access IN ('private', 'no') THEN false
+                            ELSE NULL
+                        END as is_public,
+                        -- Extract lit tag from OSM: yes = true, no = false, else NULL
+                        CASE 
+                            WHEN oc.lit = 'yes' THEN true
+                            WHEN oc.lit = 'no' THEN false
+                            ELSE NULL
+                        END as has_lights
+                    FROM osm_courts_temp oc
+                    -- Fallback names by sport (mirrors clustering.FALLBACK_NAMES); other sports get '<sport> court'
+                    LEFT JOIN (VALUES
+                        ('basketball', 'basketball court'),
+                        ('tennis', 'tennis court'),
+                        ('soccer', 'soccer field'),
+                        ('volleyball', 'volleyball court'),
+                        ('pickleball', 'pickleball court')
+                    ) AS fallback(sport, name) ON fallback.sport = oc.sport
+                    -- facility_id references osm_facilities.id, so this join adds at most one row per court
+                    LEFT JOIN osm_facilities school_fac
+                        ON school_fac.id = oc.facility_id
+                       AND school_fac.facility_type IN ('school', 'university', 'college')
+                    ON CONFLICT (osm_id) DO UPDATE SET
+                        sport = EXCLUDED.sport,
+                        geom = EXCLUDED.geom,
+                        centroid = EXCLUDED.centroid,
+                        fallback_name = EXCLUDED.fallback_name,
+                        surface_type = EXCLUDED.surface_type,
+                        cluster_id = EXCLUDED.cluster_id,
+                        facility_name = EXCLUDED.facility_name,
+                        hoops = EXCLUDED.hoops,
+                        school = EXCLUDED.school,
+                        is_public = EXCLUDED.is_public,
+                        has_lights = EXCLUDED.has_lights,
+                        updated_at = NOW()
+                    -- Skip the write (and the updated_at bump) when nothing changed
+                    WHERE (
+                        courts.sport, courts.geom, courts.centroid, courts.fallback_name,
+                        courts.surface_type, courts.cluster_id, courts.facility_name, courts.hoops,
+                        courts.school, courts.is_public, courts.has_lights
+                    ) IS DISTINCT FROM (
+                        EXCLUDED.sport, EXCLUDED.geom, EXCLUDED.centroid, EXCLUDED.fallback_name,
+                        EXCLUDED.surface_type, EXCLUDED.cluster_id, EXCLUDED.facility_name, EXCLUDED.hoops,
+                        EXCLUDED.school, EXCLUDED.is_public, EXCLUDED.has_lights
+                    );
+                """, (region,))
+                
+                inserted_count = cursor.rowcount
+        
         except Exception as e:
-            if conn:
-                conn.rollback()
             logger.error(json.dumps({
                 'event': 'courts_transfer_error',
                 'error': str(e)
             }))
             raise
-        finally:
-            if conn:
-                conn.close()
+        
+        logger.info(json.dumps({
+            'event': 'courts_transfer_completed',
+            'inserted_or_updated_courts': inserted_count
+        }))
+        
+        return {'inserted_or_updated_courts': inserted_count}
 
-    def transfer_cluster_ids_to_courts(self) -> Dict[str, Any]:
+    def transfer_cluster_ids_to_courts(self, conn=None) -> Dict[str, Any]:
         """
         Transfer cluster_id from osm_courts_temp to courts table
         Matches courts by osm_id (updates existing rows only)
+        
+        Args:
+            conn: Connection from session() to run inside the caller's transaction (default: own transaction)
         """
-        conn = None
+        logger.info(json.dumps({
+            'event': 'cluster_id_transfer_started',
+            'source_table': 'osm_courts_temp',
+            'target_table': 'courts'
+        }))
+        
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            logger.info(json.dumps({
-                'event': 'cluster_id_transfer_started',
-                'source_table': 'osm_courts_temp',
-                'target_table': 'courts'
-            }))
-            
-            # Transfer cluster_id from staging to production table
-            cursor.execute("""
-                UPDATE courts c
-                SET cluster_id = oc.cluster_id,
-                    updated_at = NOW()
-                FROM osm_courts_temp oc
-                WHERE c.osm_id = oc.osm_id
-                  AND oc.cluster_id IS NOT NULL;
-            """)
-            
-            updated_count = cursor.rowcount
-            
-            conn.commit()
-            
-            logger.info(json.dumps({
-                'event': 'cluster_id_transfer_completed',
-                'updated_courts': updated_count
-            }))
-            
-            return {'updated_courts': updated_count}
-            
+            with self._transaction(conn) as conn:
+                cursor = conn.cursor()
+                
+                # Transfer cluster_id from staging to production table
+                cursor.execute("""
+                    UPDATE courts c
+                    SET cluster_id = oc.cluster_id,
+                        updated_at = NOW()
+                    FROM osm_courts_temp oc
+                    -- courts.osm_id is VARCHAR, staging osm_id is BIGINT: cast the staging side
+                    -- so the join probes the existing unique index on courts.osm_id
+                    WHERE c.osm_id = oc.osm_id::text
+                      AND oc.cluster_id IS NOT NULL
+                      AND c.cluster_id IS DISTINCT FROM oc.cluster_id;
+                """)
+                
+                updated_count = cursor.rowcount
+        
         except Exception as e:
-            if conn:
-                conn.rollback()
             logger.error(json.dumps({
                 'event': 'cluster_id_transfer_error',
                 'error': str(e)
             }))
             raise
-        finally:
-            if conn:
-                conn.close()
+        
+        logger.info(json.dumps({
+            'event': 'cluster_id_transfer_completed',
+            'updated_courts': updated_count
+        }))
+        
+        return {'updated_courts': updated_count}
 
 def main():
     """Main function to populate cluster metadata"""
@@ -333,8 +365,16 @@ def main():
     try:
         populator = ClusterMetadataPopulator(connection_string)
         
-        # Step 1: Populate cluster_id in staging table
-        summary = populator.populate_cluster_metadata()
+        try:
+            # Both steps share one connection and commit together
+            with populator.session() as conn:
+                # Step 1: Populate cluster_id in staging table
+                summary = populator.populate_cluster_metadata(conn)
+                
+                # Step 2: Transfer to production table
+                transfer_summary = populator.transfer_cluster_ids_to_courts(conn)
+        finally:
+            populator.close()
         
         print("📊 CLUSTER METADATA RESULTS (osm_courts_temp):")
         print(f"   Total Courts: {summary['total_courts']}")
@@ -347,8 +387,6 @@ def main():
         print(f"   Largest Cluster: {summary['largest_cluster_size']} courts")
         print()
         
-        # Step 2: Transfer to production table
-        transfer_summary = populator.transfer_cluster_ids_to_courts()
         print(f"📤 TRANSFERRED TO COURTS TABLE:")
         print(f"   Updated Courts: {transfer_summary['updated_courts']}")
         print()
@@ -7,11 +7,19 @@ Query OpenStreetMap Overpass API for:
 4. Store results in PostGIS database
 """
 
-import json
+import hashlib
 import logging
+import random
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import psycopg2
-from psycopg2.extras import Json
+from psycopg2.extras import Json, execute_values
 from typing import Dict, List, Any, Optional, Tuple
 from shapely.geometry import Point, Polygon, MultiPolygon, box
 from shapely.ops import unary_union
@@ -29,81 +37,140 @@ logger = logging.getLogger(__name__)
 # San Francisco bounding box: south, west, north, east
 SF_BBOX = (37.7, -122.52, 37.83, -122.35)
 
-class OverpassQuerier:
-    """Handles Overpass API queries"""
-    
-    def __init__(self, base_url: str = 'https://overpass-api.de/api/interpreter'):
-        self.base_url = base_url
-    
-    def query_courts(self, bbox: Tuple[float, float, float, float], sports: List[str] = None) -> Dict[str, Any]:
-        """Query for courts: leisure=pitch with sport tags"""
-        if sports is None:
-            sports = ['basketball', 'tennis', 'soccer', 'volleyball', 'pickleball', 'beachvolleyball', 'american_football', 'baseball']
-        
-        south, west, north, east = bbox
-        sport_queries = []
-        for sport in sports:
-            sport_queries.append(f'  way["leisure"="pitch"]["sport"="{sport}"]({south},{west},{north},{east});')
-        
-        query = f"""[out:json][timeout:90];
+# HTTP statuses worth retrying (rate limited, gateway errors, server overloaded)
+RETRYABLE_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+# Connection-level retries handled by urllib3 (DNS failures, refused/reset connections
+# before the query is sent). Status-based retries stay in _execute_query so they can
+# honour Retry-After and fail over to the mirror; read errors are not retried because
+# the query may already be running on the server.
+CONNECT_RETRIES = Retry(total=3, connect=3, read=0, status=0, backoff_factor=0.5)
+
+# Upper bound (seconds) on a server-sent Retry-After, so a misbehaving server or proxy
+# cannot stall the pipeline for hours
+MAX_RETRY_AFTER = 300
+
+# Rows per INSERT statement for batched staging writes (execute_values defaults to 100)
+INSERT_PAGE_SIZE = 1000
+
+# How many skipped osm_ids a failure warning lists; the full list is logged at DEBUG
+MAX_LOGGED_FAILURES = 10
+
+# Sports queried when no filter is given
+DEFAULT_SPORTS = ('basketball', 'tennis', 'soccer', 'volleyball', 'pickleball', 'beachvolleyball', 'american_football', 'baseball')
+
+# Overpass QL templates. The bbox is set once as a global [bbox:south,west,north,east]
+# setting, which applies to every statement in the query.
+COURTS_QUERY_TEMPLATE = """[out:json][timeout:90][bbox:{bbox}];
 (
-{chr(10).join(sport_queries)}
+{statements}
 );
 out geom;"""
-        
-        logger.info(f"Querying courts with sports: {sports}")
-        return self._execute_query(query)
-    
-    def query_facilities(self, bbox: Tuple[float, float, float, float]) -> Dict[str, Any]:
-        """Query for facilities: parks, playgrounds, schools, community centres, sports centres, stadiums, sports clubs, places of worship"""
-        south, west, north, east = bbox
-        
-        query = f"""[out:json][timeout:90];
+
+FACILITIES_QUERY_TEMPLATE = """[out:json][timeout:90][bbox:{bbox}];
 (
   // Parks
-  node["leisure"="park"]({south},{west},{north},{east});
-  way["leisure"="park"]({south},{west},{north},{east});
-  relation["leisure"="park"]({south},{west},{north},{east});
+  nwr["leisure"="park"];
   // Playgrounds
-  node["leisure"="playground"]({south},{west},{north},{east});
-  way["leisure"="playground"]({south},{west},{north},{east});
-  relation["leisure"="playground"]({south},{west},{north},{east});
+  nwr["leisure"="playground"];
   // Schools
-  node["amenity"="school"]({south},{west},{north},{east});
-  way["amenity"="school"]({south},{west},{north},{east});
-  relation["amenity"="school"]({south},{west},{north},{east});
-  node["building"="school"]({south},{west},{north},{east});
-  way["building"="school"]({south},{west},{north},{east});
-  relation["building"="school"]({south},{west},{north},{east});
+  nwr["amenity"="school"];
+  nwr["building"="school"];
   // Universities/colleges
-  node["amenity"="university"]({south},{west},{north},{east});
-  way["amenity"="university"]({south},{west},{north},{east});
-  relation["amenity"="university"]({south},{west},{north},{east});
-  node["amenity"="college"]({south},{west},{north},{east});
-  way["amenity"="college"]({south},{west},{north},{east});
-  relation["amenity"="college"]({south},{west},{north},{east});
+  nwr["amenity"="university"];
+  nwr["amenity"="college"];
   // Community centres
-  node["amenity"="community_centre"]({south},{west},{north},{east});
-  way["amenity"="community_centre"]({south},{west},{north},{east});
-  relation["amenity"="community_centre"]({south},{west},{north},{east});
+  nwr["amenity"="community_centre"];
   // Sports centres
-  node["leisure"="sports_centre"]({south},{west},{north},{east});
-  way["leisure"="sports_centre"]({south},{west},{north},{east});
-  relation["leisure"="sports_centre"]({south},{west},{north},{east});
+  nwr["leisure"="sports_centre"];
   // Stadiums
-  node["leisure"="stadium"]({south},{west},{north},{east});
-  way["leisure"="stadium"]({south},{west},{north},{east});
-  relation["leisure"="stadium"]({south},{west},{north},{east});
+  nwr["leisure"="stadium"];
   // Sports clubs
-  node["club"="sport"]({south},{west},{north},{east});
-  way["club"="sport"]({south},{west},{north},{east});
-  relation["club"="sport"]({south},{west},{north},{east});
+  nwr["club"="sport"];
   // Places of worship
-  node["amenity"="place_of_worship"]({south},{west},{north},{east});
-  way["amenity"="place_of_worship"]({south},{west},{north},{east});
-  relation["amenity"="place_of_worship"]({south},{west},{north},{east});
+  nwr["amenity"="place_of_worship"];
 );
 out geom;"""
+
+class OverpassQuerier:
+    """Handles Overpass API queries"""
+    
+    def __init__(self, base_url: str = 'https://overpass-api.de/api/interpreter',
+                 max_requests_per_window: int = 2, window_seconds: float = 10.0,
+                 cache_dir: Optional[str] = None, cache_ttl_seconds: float = 86400,
+                 failure_threshold: int = 3, cooldown_seconds: float = 300.0):
+        """
+        Initialize querier
+        
+        Args:
+            base_url: Primary Overpass interpreter endpoint
+            max_requests_per_window: Requests allowed to start within one window (Overpass grants 2 slots per IP)
+            window_seconds: Length of the sliding rate-limit window
+            cache_dir: Directory for cached responses (development only; defaults to OVERPASS_CACHE_DIR, unset = no caching)
+            cache_ttl_seconds: Maximum age of a cached response
+            failure_threshold: Consecutive failures after which an endpoint is skipped
+            cooldown_seconds: How long a failing endpoint is skipped before it is tried again
+        """
+        self.base_url = base_url
+        self.cache_dir = cache_dir or os.getenv('OVERPASS_CACHE_DIR')
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.max_requests_per_window = max_requests_per_window
+        self.window_seconds = window_seconds
+        # Start times of recent requests per endpoint; a full deque means that endpoint's bucket is empty
+        self._request_times: Dict[str, deque] = {}
+        self._rate_limit_lock = threading.Lock()
+        # One requests.Session per thread (Session is not guaranteed thread-safe);
+        # each reuses its TCP/TLS connections across queries and retries
+        self._thread_local = threading.local()
+        self._sessions: List[requests.Session] = []
+        self._sessions_lock = threading.Lock()
+        # Circuit breaker per endpoint: consecutive failure count and the time until
+        # which the endpoint is skipped once that count reaches failure_threshold
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._endpoint_failures: Dict[str, int] = {}
+        self._endpoint_open_until: Dict[str, float] = {}
+        self._breaker_lock = threading.Lock()
+        # Set by cancel(): queries stop at their next attempt or wait instead of
+        # running through their remaining retries and backoff
+        self._cancelled = threading.Event()
+    
+    @property
+    def session(self) -> requests.Session:
+        """HTTP session for the calling thread"""
+        session = getattr(self._thread_local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(max_retries=CONNECT_RETRIES))
+            self._thread_local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+    
+    def query_courts(self, bbox: Tuple[float, float, float, float], sports: List[str] = None) -> Dict[str, Any]:
+        """Query for courts: leisure=pitch with sport tags"""
+        if sports is None:
+            sports = DEFAULT_SPORTS
+        
+        query = self._build_courts_query(tuple(sports), tuple(bbox))
+        
+        logger.info("Querying courts with sports: %s", sports)
+        return self._execute_query(query)
+    
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _build_courts_query(sports: Tuple[str, ...], bbox: Tuple[float, float, float, float]) -> str:
+        """Build the courts query (memoized per sports/bbox combination)"""
+        sport_queries = '\n'.join(
+            f'  way["leisure"="pitch"]["sport"="{sport}"];'
+            for sport in sports
+        )
+        
+        return COURTS_QUERY_TEMPLATE.format(bbox=','.join(map(str, bbox)), statements=sport_queries)
+    
+    def query_facilities(self, bbox: Tuple[float, float, float, float]) -> Dict[str, Any]:
+        """Query for facilities: parks, playgrounds, schools, community centres, sports centres, stadiums, sports clubs, places of worship"""
+        query = FACILITIES_QUERY_TEMPLATE.format(bbox=','.join(map(str, bbox)))
         
         logger.info("Querying facilities (parks, playgrounds, schools, community centres, sports centres, stadiums, sports clubs, places of worship)")
         return self._execute_query(query)
@@ -116,31 +183,169 @@ out geom;"""
         ]
         backoff_seconds = 30
         
+        cached = self._read_cache(query)
+        if cached is not None:
+            return cached
+        
         for attempt in range(max_retries):
-            # Alternate between endpoints on retries
-            endpoint = endpoints[attempt % len(endpoints)]
+            self._check_cancelled()
+            # Alternate between endpoints on retries, skipping any that keep failing
+            endpoint = self._select_endpoint(endpoints, attempt)
             
             try:
-                logger.info(f"Querying {endpoint} (attempt {attempt + 1}/{max_retries})")
-                response = requests.post(
+                self._rate_limit(endpoint)
+                logger.info("Querying %s (attempt %d/%d)", endpoint, attempt + 1, max_retries)
+                response = self.session.post(
                     endpoint,
                     data={'data': query},
                     timeout=180  # Increased timeout
                 )
                 response.raise_for_status()
-                return response.json()
-            except (requests.Timeout, requests.HTTPError) as e:
+                # Responses can be tens of MB; orjson parses the raw bytes directly
+                data = orjson.loads(response.content)
+                self._record_success(endpoint)
+                self._write_cache(query, response.content)
+                return data
+            except (requests.Timeout, requests.ConnectionError, requests.HTTPError) as e:
+                status_code = e.response.status_code if e.response is not None else None
+                if status_code is not None and status_code not in RETRYABLE_STATUS_CODES:
+                    # e.g. 400 for a malformed query - retrying will not help
+                    logger.error("Query rejected with HTTP %d: %s", status_code, e)
+                    raise
+                self._record_failure(endpoint)
                 if attempt < max_retries - 1:
-                    wait_time = backoff_seconds * (2 ** attempt)  # 30s, 60s
-                    logger.warning(f"Overpass API failed (attempt {attempt + 1}/{max_retries}): {e}")
-                    logger.info(f"Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
+                    wait_time = self._retry_delay(e.response, attempt, backoff_seconds)
+                    logger.warning("Overpass API failed (attempt %d/%d): %s", attempt + 1, max_retries, e)
+                    logger.info("Retrying in %.1f seconds...", wait_time)
+                    self._cancelled.wait(wait_time)
                 else:
-                    logger.error(f"Query failed after {max_retries} attempts: {e}")
+                    logger.error("Query failed after %d attempts: %s", max_retries, e)
                     raise
             except Exception as e:
-                logger.error(f"Query failed: {e}")
+                logger.error("Query failed: %s", e)
                 raise
+    
+    def cancel(self):
+        """Stop queries at their next attempt or wait (a request already sent still runs to completion)"""
+        self._cancelled.set()
+    
+    def _check_cancelled(self):
+        """Raise if cancel() has been called"""
+        if self._cancelled.is_set():
+            raise RuntimeError("Overpass query cancelled")
+    
+    def close(self):
+        """Close pooled HTTP connections"""
+        for session in self._sessions:
+            session.close()
+        self._sessions.clear()
+    
+    def _select_endpoint(self, endpoints: List[str], attempt: int) -> str:
+        """Pick the endpoint for this attempt, skipping endpoints whose circuit is open"""
+        now = time.monotonic()
+        with self._breaker_lock:
+            for offset in range(len(endpoints)):
+                endpoint = endpoints[(attempt + offset) % len(endpoints)]
+                if self._endpoint_open_until.get(endpoint, 0.0) <= now:
+                    return endpoint
+        
+        raise RuntimeError(
+            f"All Overpass endpoints failed {self.failure_threshold} times in a row; "
+            f"not retrying for {self.cooldown_seconds:.0f} seconds"
+        )
+    
+    def _record_failure(self, endpoint: str):
+        """Count a failed request; open the endpoint's circuit after failure_threshold in a row"""
+        with self._breaker_lock:
+            failures = self._endpoint_failures.get(endpoint, 0) + 1
+            self._endpoint_failures[endpoint] = failures
+            if failures >= self.failure_threshold:
+                self._endpoint_open_until[endpoint] = time.monotonic() + self.cooldown_seconds
+                logger.warning("%s failed %d times in a row, skipping it for %.0f seconds",
+                               endpoint, failures, self.cooldown_seconds)
+    
+    def _record_success(self, endpoint: str):
+        """Close the endpoint's circuit after a successful request"""
+        with self._breaker_lock:
+            self._endpoint_failures.pop(endpoint, None)
+            self._endpoint_open_until.pop(endpoint, None)
+    
+    def _retry_delay(self, response: Optional[requests.Response], attempt: int, backoff_seconds: float) -> float:
+        """Seconds to wait before the next attempt: server's Retry-After if given, else jittered exponential backoff"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            retry_after = retry_after.strip()
+            if retry_after.isdigit():
+                return min(float(retry_after), MAX_RETRY_AFTER)
+            
+            # HTTP-date form, e.g. "Wed, 21 Oct 2015 07:28:00 GMT"
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                retry_at = None
+            if retry_at is not None and retry_at.tzinfo is not None:
+                return min(max(retry_at.timestamp() - time.time(), 0.0), MAX_RETRY_AFTER)
+        
+        # ~30s, ~60s, ... with jitter so concurrent runs don't retry in lockstep
+        wait_time = backoff_seconds * (2 ** attempt)
+        return random.uniform(wait_time / 2, wait_time)
+    
+    def _rate_limit(self, endpoint: str):
+        """Wait for a free request slot on this endpoint (token bucket over a sliding window)"""
+        with self._rate_limit_lock:
+            request_times = self._request_times.get(endpoint)
+            if request_times is None:
+                request_times = self._request_times[endpoint] = deque(maxlen=self.max_requests_per_window)
+            
+            # Reserve the earliest free slot, then sleep outside the lock so
+            # other endpoints (and other threads) are not held up
+            now = time.monotonic()
+            start = now
+            if len(request_times) == request_times.maxlen:
+                start = max(now, request_times[0] + self.window_seconds)
+            request_times.append(start)
+        
+        wait_time = start - now
+        if wait_time > 0:
+            logger.info("Rate limit reached for %s, waiting %.2f seconds...", endpoint, wait_time)
+            self._cancelled.wait(wait_time)
+            self._check_cancelled()
+    
+    def _cache_path(self, query: str) -> str:
+        """Cache file path for a query (keyed by its SHA-256)"""
+        return os.path.join(self.cache_dir, hashlib.sha256(query.encode('utf-8')).hexdigest() + '.json')
+    
+    def _read_cache(self, query: str) -> Optional[Dict[str, Any]]:
+        """Return a cached response for this query if caching is enabled and the entry is fresh"""
+        if not self.cache_dir:
+            return None
+        
+        path = self._cache_path(query)
+        try:
+            if time.time() - os.path.getmtime(path) > self.cache_ttl_seconds:
+                return None
+            with open(path, 'rb') as f:
+                data = orjson.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        
+        logger.info("Using cached Overpass response %s", path)
+        return data
+    
+    def _write_cache(self, query: str, content: bytes):
+        """Store a raw response body for this query if caching is enabled"""
+        if not self.cache_dir:
+            return
+        
+        path = self._cache_path(query)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write Overpass cache %s: %s", path, e)
 
 class CourtFacilityMatcher:
     """Matches courts to facilities using bounding box containment"""
@@ -156,13 +361,15 @@ class CourtFacilityMatcher:
         self.cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
         
         # Drop existing staging tables to ensure correct schema
-        # These are staging tables - data is transient and repopulated each run
+        # These are staging tables - data is transient and repopulated each run, so they
+        # are UNLOGGED: writes skip WAL (and commit fsyncs), at the cost of being emptied
+        # after a crash
         self.cursor.execute("DROP TABLE IF EXISTS osm_courts_temp CASCADE;")
         self.cursor.execute("DROP TABLE IF EXISTS osm_facilities CASCADE;")
         
         # Create osm_facilities staging table
         self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS osm_facilities (
+            CREATE UNLOGGED TABLE IF NOT EXISTS osm_facilities (
                 id SERIAL PRIMARY KEY,
                 osm_id BIGINT UNIQUE,
                 osm_type VARCHAR(20),
@@ -171,6 +378,9 @@ class CourtFacilityMatcher:
                 geom GEOMETRY(GEOMETRY, 4326),
                 bbox GEOMETRY(POLYGON, 4326),
                 tags JSONB,
+                -- Geodesic area used to prefer the most specific containing facility,
+                -- computed once at write time instead of on every court lookup
+                area_m2 DOUBLE PRECISION GENERATED ALWAYS AS (ST_Area(geom::geography)) STORED,
                 created_at TIMESTAMP DEFAULT NOW(),
                 updated_at TIMESTAMP DEFAULT NOW()
             )
@@ -178,16 +388,32 @@ class CourtFacilityMatcher:
         
         # Create osm_courts_temp staging table
         self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS osm_courts_temp (
+            CREATE UNLOGGED TABLE IF NOT EXISTS osm_courts_temp (
                 id SERIAL PRIMARY KEY,
                 osm_id BIGINT UNIQUE,
                 sport VARCHAR(50),
-                surface VARCHAR(100),
                 geom GEOMETRY(GEOMETRY, 4326),
                 centroid GEOMETRY(POINT, 4326),
                 tags JSONB,
+                -- Tag values read by the production transfer, extracted from tags once at write time
+                surface TEXT GENERATED ALWAYS AS (tags->>'surface') STORED,
+                -- 1-9 ASCII digits (fits an integer); checked with translate() rather than a regex
+                hoops INTEGER GENERATED ALWAYS AS (
+                    CASE
+                        WHEN length(tags->>'hoops') BETWEEN 1 AND 9
+                         AND translate(tags->>'hoops', '0123456789', '') = ''
+                        THEN (tags->>'hoops')::integer
+                    END
+                ) STORED,
+                access TEXT GENERATED ALWAYS AS (LOWER(tags->>'access')) STORED,
+                lit TEXT GENERATED ALWAYS AS (LOWER(tags->>'lit')) STORED,
                 facility_id INTEGER REFERENCES osm_facilities(id),
                 facility_name VARCHAR(255),
+                -- Clustering key: court's own OSM name if available, else the matched facility name
+                -- (recomputed whenever facility_name is updated, e.g. by the school check)
+                effective_facility_name TEXT GENERATED ALWAYS AS (
+                    COALESCE(NULLIF(tags->>'name', ''), facility_name)
+                ) STORED,
                 cluster_id UUID,
                 created_at TIMESTAMP DEFAULT NOW(),
                 updated_at TIMESTAMP DEFAULT NOW()
@@ -201,6 +427,11 @@ class CourtFacilityMatcher:
             CREATE INDEX IF NOT EXISTS idx_osm_courts_temp_geom ON osm_courts_temp USING GIST(geom);
             CREATE INDEX IF NOT EXISTS idx_osm_courts_temp_centroid ON osm_courts_temp USING GIST(centroid);
             CREATE INDEX IF NOT EXISTS idx_osm_courts_temp_facility ON osm_courts_temp(facility_id);
+            -- Clustering key used by populate_cluster_metadata
+            CREATE INDEX IF NOT EXISTS idx_osm_courts_temp_effname_sport
+                ON osm_courts_temp (effective_facility_name, sport)
+                WHERE effective_facility_name IS NOT NULL
+                  AND sport IS NOT NULL;
         """)
         
         self.conn.commit()
@@ -229,15 +460,21 @@ class CourtFacilityMatcher:
     
     def _extract_way_geometry(self, element: Dict[str, Any]) -> Optional[Polygon]:
         """Extract polygon from a way element"""
-        geometry = element.get('geometry', [])
-        if len(geometry) < 4:
+        coords = self._ring_coords(element.get('geometry', []))
+        if coords is None:
             return None
         
-        coords = []
-        for node in geometry:
-            if 'lat' in node and 'lon' in node:
-                coords.append((node['lon'], node['lat']))
+        try:
+            return Polygon(coords)
+        except:
+            return None
+    
+    def _ring_coords(self, geometry: List[Dict[str, Any]]) -> Optional[List[Tuple[float, float]]]:
+        """Convert Overpass node geometry to a closed (lon, lat) ring, or None if too short"""
+        if len(geometry) < 4:
+            return None
         
+        coords = [(node['lon'], node['lat']) for node in geometry if 'lat' in node and 'lon' in node]
         if len(coords) < 4:
             return None
         
@@ -245,10 +482,7 @@ class CourtFacilityMatcher:
         if coords[0] != coords[-1]:
             coords.append(coords[0])
         
-        try:
-            return Polygon(coords)
-        except:
-            return None
+        return coords
     
     def _extract_relation_geometry(self, element: Dict[str, Any]) -> Optional[Polygon]:
         """Extract polygon from a relation (multipolygon) element"""
@@ -263,22 +497,10 @@ class CourtFacilityMatcher:
             if member.get('role') != 'outer':
                 continue
             
-            geometry = member.get('geometry', [])
-            if len(geometry) < 4:
-                continue
-            
-            coords = []
-            for node in geometry:
-                if 'lat' in node and 'lon' in node:
-                    coords.append((node['lon'], node['lat']))
-            
-            if len(coords) < 4:
+            coords = self._ring_coords(member.get('geometry', []))
+            if coords is None:
                 continue
             
-            # Close polygon if not closed
-            if coords[0] != coords[-1]:
-                coords.append(coords[0])
-            
             try:
                 ring = Polygon(coords)
                 if ring.is_valid:
@@ -305,7 +527,10 @@ class CourtFacilityMatcher:
     
     def insert_facilities(self, facilities_data: Dict[str, Any]) -> int:
         """Insert facilities from Overpass response"""
-        count = 0
+        # Rows are built per element and written in one batched INSERT
+        # (keyed by osm_id so a repeated element cannot hit the same row twice)
+        rows = {}
+        failed = []
         elements = facilities_data.get('elements', [])
         
         for element in elements:
@@ -355,17 +580,13 @@ class CourtFacilityMatcher:
                     bounds = geom.bounds  # (minx, miny, maxx, maxy)
                     bbox_poly = box(bounds[0], bounds[1], bounds[2], bounds[3])
                 
-                # Insert into database
-                self.cursor.execute("""
-                    INSERT INTO osm_facilities (osm_id, osm_type, name, facility_type, geom, bbox, tags)
-                    VALUES (%s, %s, %s, %s, ST_GeomFromText(%s, 4326), ST_GeomFromText(%s, 4326), %s)
-                    ON CONFLICT (osm_id) DO UPDATE SET
-                        name = EXCLUDED.name,
-                        geom = EXCLUDED.geom,
-                        bbox = EXCLUDED.bbox,
-                        tags = EXCLUDED.tags
-                    RETURNING id;
-                """, (
+                # A repeated osm_id updates name/geometry/tags but keeps its first type,
+                # as the per-row ON CONFLICT upsert did
+                first = rows.get(osm_id)
+                if first is not None:
+                    osm_type, facility_type = first[1], first[3]
+                
+                rows[osm_id] = (
                     osm_id,
                     osm_type,
                     name,
@@ -373,21 +594,38 @@ class CourtFacilityMatcher:
                     geom.wkt,
                     bbox_poly.wkt,
                     Json(tags)
-                ))
-                
-                count += 1
+                )
                 
             except Exception as e:
-                logger.warning(f"Error inserting facility: {e}")
+                logger.debug("Error inserting facility %s: %s", element.get('id'), e)
+                failed.append(element.get('id'))
                 continue
         
+        self._log_failures('facilities', failed)
+        
+        execute_values(self.cursor, """
+            INSERT INTO osm_facilities (osm_id, osm_type, name, facility_type, geom, bbox, tags)
+            VALUES %s
+            ON CONFLICT (osm_id) DO UPDATE SET
+                name = EXCLUDED.name,
+                geom = EXCLUDED.geom,
+                bbox = EXCLUDED.bbox,
+                tags = EXCLUDED.tags;
+        """, rows.values(),
+            template="(%s, %s, %s, %s, ST_GeomFromText(%s, 4326), ST_GeomFromText(%s, 4326), %s)",
+            page_size=INSERT_PAGE_SIZE)
+        count = len(rows)
+        
         self.conn.commit()
-        logger.info(f"Inserted {count} facilities")
+        logger.info("Inserted %d facilities", count)
         return count
     
     def insert_courts(self, courts_data: Dict[str, Any]) -> int:
         """Insert courts from Overpass response"""
-        count = 0
+        # Rows are written in one batched INSERT (keyed by osm_id so a repeated element
+        # cannot hit the same row twice), then matched to facilities in one set-based UPDATE
+        rows = {}
+        failed = []
         elements = courts_data.get('elements', [])
         
         for element in elements:
@@ -403,78 +641,101 @@ class CourtFacilityMatcher:
                 # Get centroid
                 centroid = geom.centroid
                 
-                # Find matching facility using PostGIS
-                # Step 1: Try containment matching (court inside facility polygon)
-                # Prefer smaller facilities (more specific) over larger ones (e.g., sports_centre over park)
-                self.cursor.execute("""
-                    SELECT id, name
-                    FROM osm_facilities
-                    WHERE ST_Contains(geom, ST_GeomFromText(%s, 4326))
-                    ORDER BY ST_Area(geom::geography) ASC, name NULLS LAST
-                    LIMIT 1;
-                """, (centroid.wkt,))
-                
-                result = self.cursor.fetchone()
-                
-                # Step 2: If no containment match OR containment found unnamed facility,
-                # try proximity matching (within 100m) to find a named facility
-                should_try_proximity = not result or (result is not None and result[1] is None)
-                
-                if should_try_proximity:
-                    containment_result = result  # Save containment result as fallback
-                    self.cursor.execute("""
-                        SELECT id, name, ST_Distance(geom::geography, ST_GeomFromText(%s, 4326)::geography) as dist
-                        FROM osm_facilities
-                        WHERE ST_DWithin(geom::geography, ST_GeomFromText(%s, 4326)::geography, 100)
-                        AND name IS NOT NULL
-                        ORDER BY dist
-                        LIMIT 1;
-                    """, (centroid.wkt, centroid.wkt))
-                    proximity_result = self.cursor.fetchone()
-                    
-                    # Prefer named proximity result over unnamed containment result
-                    if proximity_result:
-                        result = proximity_result
-                    elif containment_result:
-                        result = containment_result
-                    else:
-                        result = None
-                
-                facility_id = result[0] if result else None
-                facility_name = result[1] if result else None
-                
-                # Insert court
-                self.cursor.execute("""
-                    INSERT INTO osm_courts_temp (osm_id, sport, geom, centroid, tags, facility_id, facility_name)
-                    VALUES (%s, %s, ST_GeomFromText(%s, 4326), ST_GeomFromText(%s, 4326), %s, %s, %s)
-                    ON CONFLICT (osm_id) DO UPDATE SET
-                        sport = EXCLUDED.sport,
-                        geom = EXCLUDED.geom,
-                        centroid = EXCLUDED.centroid,
-                        tags = EXCLUDED.tags,
-                        facility_id = EXCLUDED.facility_id,
-                        facility_name = EXCLUDED.facility_name
-                    RETURNING id;
-                """, (
+                rows[osm_id] = (
                     osm_id,
                     sport,
                     geom.wkt,
                     centroid.wkt,
-                    Json(tags),
-                    facility_id,
-                    facility_name
-                ))
-                
-                count += 1
+                    Json(tags)
+                )
                 
             except Exception as e:
-                logger.warning(f"Error inserting court: {e}")
+                logger.debug("Error inserting court %s: %s", element.get('id'), e)
+                failed.append(element.get('id'))
                 continue
         
+        self._log_failures('courts', failed)
+        
+        execute_values(self.cursor, """
+            INSERT INTO osm_courts_temp (osm_id, sport, geom, centroid, tags)
+            VALUES %s
+            ON CONFLICT (osm_id) DO UPDATE SET
+                sport = EXCLUDED.sport,
+                geom = EXCLUDED.geom,
+                centroid = EXCLUDED.centroid,
+                tags = EXCLUDED.tags;
+        """, rows.values(),
+            template="(%s, %s, ST_GeomFromText(%s, 4326), ST_GeomFromText(%s, 4326), %s)",
+            page_size=INSERT_PAGE_SIZE)
+        count = len(rows)
+        
+        self._match_courts_to_facilities(list(rows))
+        
         self.conn.commit()
-        logger.info(f"Inserted {count} courts")
+        logger.info("Inserted %d courts", count)
         return count
     
+    def _match_courts_to_facilities(self, osm_ids: List[int]):
+        """
+        Set facility_id/facility_name for the given staged courts in one statement
+        
+        Args:
+            osm_ids: OSM IDs of the courts to (re)match
+        """
+        # Find matching facility using PostGIS, one LATERAL lookup per court centroid
+        # Step 1: Try containment matching (court inside facility polygon)
+        # Prefer smaller facilities (more specific) over larger ones (e.g., sports_centre over park)
+        # Step 2: If no containment match OR containment found unnamed facility,
+        # try proximity matching (within 100m) to find a named facility
+        # Prefer named proximity result over unnamed containment result
+        self.cursor.execute("""
+            WITH matches AS (
+                SELECT
+                    c.id AS court_id,
+                    CASE WHEN nearby.id IS NOT NULL THEN nearby.id ELSE containing.id END AS facility_id,
+                    CASE WHEN nearby.id IS NOT NULL THEN nearby.name ELSE containing.name END AS facility_name
+                FROM osm_courts_temp c
+                LEFT JOIN LATERAL (
+                    SELECT f.id, f.name
+                    FROM osm_facilities f
+                    WHERE ST_Contains(f.geom, c.centroid)
+                    ORDER BY f.area_m2 ASC, f.name NULLS LAST
+                    LIMIT 1
+                ) containing ON true
+                LEFT JOIN LATERAL (
+                    SELECT f.id, f.name
+                    FROM osm_facilities f
+                    WHERE containing.name IS NULL
+                      -- Index-usable prefilter in degrees: 100 m expressed in degrees of longitude
+                      -- at the court's latitude (the wider of the two axes), so it never excludes
+                      -- a facility the exact geography check would accept
+                      AND ST_DWithin(f.geom, c.centroid, 100 / (111195 * cos(radians(ST_Y(c.centroid)))))
+                      AND ST_DWithin(f.geom::geography, c.centroid::geography, 100)
+                      AND f.name IS NOT NULL
+                    ORDER BY ST_Distance(f.geom::geography, c.centroid::geography)
+                    LIMIT 1
+                ) nearby ON true
+                WHERE c.osm_id = ANY(%s)
+            )
+            UPDATE osm_courts_temp c
+            SET facility_id = m.facility_id,
+                facility_name = m.facility_name
+            FROM matches m
+            WHERE c.id = m.court_id
+              AND (c.facility_id, c.facility_name) IS DISTINCT FROM (m.facility_id, m.facility_name);
+        """, (osm_ids,))
+    
+    def _log_failures(self, kind: str, failed: List[Any]):
+        """Log one warning for all elements that could not be inserted (full id list at DEBUG)"""
+        if not failed:
+            return
+        
+        shown = ', '.join(map(str, failed[:MAX_LOGGED_FAILURES]))
+        if len(failed) > MAX_LOGGED_FAILURES:
+            shown += f', ... ({len(failed) - MAX_LOGGED_FAILURES} more)'
+        logger.warning("Skipped %d %s that could not be inserted (osm_ids: %s)", len(failed), kind, shown)
+        logger.debug("All skipped %s osm_ids: %s", kind, ', '.join(map(str, failed)))
+    
     def get_results(self) -> Dict[str, Any]:
         """Get matching results"""
         # Get courts with facility matches
@@ -520,7 +781,7 @@ def main():
         connection_string = sys.argv[1]
     if len(sys.argv) > 2:
         # Sports can be comma-separated: "basketball,tennis" or single: "basketball"
-        sports = [s.strip() for s in sys.argv[2].split(',')]
+        sports = [sys.intern(s.strip()) for s in sys.argv[2].split(',')]
     
     # Fall back to environment variable if not provided
     if not connection_string:
@@ -537,45 +798,45 @@ def main():
     querier = OverpassQuerier()
     matcher = CourtFacilityMatcher(connection_string)
     
-    total_start = time.time()
+    total_start = time.perf_counter()
     
     try:
         # Step 1: Query facilities first (parks, playgrounds, schools)
-        step1_start = time.time()
+        step1_start = time.perf_counter()
         logger.info("Step 1: Querying facilities...")
         facilities_data = querier.query_facilities(SF_BBOX)
-        query1_time = time.time() - step1_start
+        query1_time = time.perf_counter() - step1_start
         
-        step1_insert_start = time.time()
+        step1_insert_start = time.perf_counter()
         facilities_count = matcher.insert_facilities(facilities_data)
-        insert1_time = time.time() - step1_insert_start
-        step1_total = time.time() - step1_start
+        insert1_time = time.perf_counter() - step1_insert_start
+        step1_total = time.perf_counter() - step1_start
         
-        logger.info(f"   ✓ Query took {query1_time:.2f}s, Insert took {insert1_time:.2f}s, Total: {step1_total:.2f}s")
+        logger.info("   ✓ Query took %.2fs, Insert took %.2fs, Total: %.2fs", query1_time, insert1_time, step1_total)
         
         # Step 2: Query courts (with optional sport filter)
-        step2_start = time.time()
+        step2_start = time.perf_counter()
         if sports:
-            logger.info(f"Step 2: Querying courts for sports: {sports}...")
+            logger.info("Step 2: Querying courts for sports: %s...", sports)
         else:
             logger.info("Step 2: Querying courts for all sports...")
         courts_data = querier.query_courts(SF_BBOX, sports=sports)
-        query2_time = time.time() - step2_start
+        query2_time = time.perf_counter() - step2_start
         
-        step2_insert_start = time.time()
+        step2_insert_start = time.perf_counter()
         courts_count = matcher.insert_courts(courts_data)
-        insert2_time = time.time() - step2_insert_start
-        step2_total = time.time() - step2_start
+        insert2_time = time.perf_counter() - step2_insert_start
+        step2_total = time.perf_counter() - step2_start
         
-        logger.info(f"   ✓ Query took {query2_time:.2f}s, Insert took {insert2_time:.2f}s, Total: {step2_total:.2f}s")
+        logger.info("   ✓ Query took %.2fs, Insert took %.2fs, Total: %.2fs", query2_time, insert2_time, step2_total)
         
         # Step 3: Get results
-        step3_start = time.time()
+        step3_start = time.perf_counter()
         logger.info("Step 3: Getting matched results...")
         results = matcher.get_results()
-        step3_time = time.time() - step3_start
+        step3_time = time.perf_counter() - step3_start
         
-        total_time = time.time() - total_start
+        total_time = time.perf_counter() - total_start
         
         print(f"\n✅ Complete!")
         print(f"   Facilities found: {facilities_count}")
@@ -598,6 +859,7 @@ def main():
         
     finally:
         matcher.close()
+        querier.close()
 
 if __name__ == '__main__':
     main()
@@ -13,6 +13,7 @@ import os
 import json
 import logging
 import psycopg2
+from concurrent.futures import ThreadPoolExecutor
 from query_courts_and_facilities import OverpassQuerier, CourtFacilityMatcher
 from populate_cluster_metadata import ClusterMetadataPopulator
 from add_individual_court_names import IndividualCourtNameManager
@@ -63,18 +64,17 @@ def record_coverage_area(connection_string, bbox, region, name, court_count):
             VALUES (%s, %s, ST_GeomFromGeoJSON(%s), %s, NOW())
             ON CONFLICT (region, name)
                 DO UPDATE SET
-                    boundary = ST_GeomFromGeoJSON(%s),
-                    court_count = %s,
-                    last_updated = NOW()
-        """, (name, region, json.dumps(boundary_geojson), court_count,
-              json.dumps(boundary_geojson), court_count))
+                    boundary = EXCLUDED.boundary,
+                    court_count = EXCLUDED.court_count,
+                    last_updated = EXCLUDED.last_updated
+        """, (name, region, json.dumps(boundary_geojson), court_count))
 
         conn.commit()
-        logger.info(f"   ✅ Coverage area '{name}' recorded with {court_count} courts")
+        logger.info("   ✅ Coverage area '%s' recorded with %d courts", name, court_count)
 
     except Exception as e:
         conn.rollback()
-        logger.error(f"   ❌ Failed to record coverage area: {e}")
+        logger.error("   ❌ Failed to record coverage area: %s", e)
         raise
     finally:
         cursor.close()
@@ -104,7 +104,7 @@ def main():
     # Get sports filter (optional)
     sports = None
     if len(sys.argv) > 2:
-        sports = [s.strip() for s in sys.argv[2].split(',')]
+        sports = [sys.intern(s.strip()) for s in sys.argv[2].split(',')]
         print(f"🎯 Filtering for sports: {sports}")
     else:
         print("🎯 Processing all sports")
@@ -139,6 +139,8 @@ def main():
     print("="*60)
     print()
     
+    querier = None
+    matcher = None
     try:
         # Step 1: Query and import facilities and courts
         print("📥 STEP 1: Querying Overpass API and importing data...")
@@ -146,13 +148,28 @@ def main():
         querier = OverpassQuerier()
         matcher = CourtFacilityMatcher(connection_string)
         
-        # Query facilities
-        facilities_data = querier.query_facilities(bbox)
-        facilities_count = matcher.insert_facilities(facilities_data)
-        print(f"   ✅ Imported {facilities_count} facilities")
+        # Query facilities and courts (with optional sport filter) concurrently -
+        # the two Overpass requests are independent. Facilities are inserted as soon
+        # as they arrive, overlapping the insert with the courts request still in flight.
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            facilities_future = executor.submit(querier.query_facilities, bbox)
+            courts_future = executor.submit(querier.query_courts, bbox, sports)
+            
+            facilities_count = matcher.insert_facilities(facilities_future.result())
+            print(f"   ✅ Imported {facilities_count} facilities")
+            
+            courts_data = courts_future.result()
+        except Exception:
+            # Stop the courts query at its next retry or backoff wait rather than letting it run
+            # its full retry chain; wait only for a request already in flight, so the querier's
+            # sessions are not closed under it
+            querier.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown()
         
-        # Query courts (with optional sport filter)
-        courts_data = querier.query_courts(bbox, sports=sports)
+        # Courts are matched against the facilities inserted above
         courts_count = matcher.insert_courts(courts_data)
         print(f"   ✅ Imported {courts_count} courts")
         print()
@@ -161,23 +178,30 @@ def main():
         print("🏫 STEP 2: Detecting courts within schools...")
         print("-" * 60)
         school_checker = SchoolChecker(connection_string)
-        school_summary = school_checker.batch_check_courts_in_schools()
+        try:
+            school_summary = school_checker.batch_check_courts_in_schools()
+        finally:
+            school_checker.close()
         print(f"   ✅ Checked {school_summary['total_courts_checked']} courts")
         print(f"   ✅ Found {school_summary['courts_in_schools']} courts within schools")
-        school_checker.close()
         print()
         
         # Step 3: Cluster courts
         print("🔗 STEP 3: Clustering courts by facility_name + sport...")
         print("-" * 60)
         populator = ClusterMetadataPopulator(connection_string)
-        cluster_summary = populator.populate_cluster_metadata()
+        try:
+            # Clustering and the production transfer share one connection and commit together
+            with populator.session() as conn:
+                cluster_summary = populator.populate_cluster_metadata(conn)
+                
+                # Transfer courts to production table
+                transfer_summary = populator.transfer_courts_to_production(region=region, conn=conn)
+        finally:
+            populator.close()
         print(f"   ✅ Created {cluster_summary['total_clusters']} clusters")
         print(f"   ✅ {cluster_summary['multi_court_clusters']} multi-court clusters")
         print(f"   ✅ Largest cluster: {cluster_summary['largest_cluster_size']} courts")
-        
-        # Transfer courts to production table
-        transfer_summary = populator.transfer_courts_to_production(region=region)
         print(f"   ✅ Transferred {transfer_summary['inserted_or_updated_courts']} courts to production table")
         print()
         
@@ -185,10 +209,13 @@ def main():
         print("🏷️  STEP 4: Assigning individual court names...")
         print("-" * 60)
         name_manager = IndividualCourtNameManager(connection_string)
-        if not name_manager.verify_individual_court_name_column():
-            print("   ❌ Column 'individual_court_name' does not exist. Please run migrations first.")
-            return False
-        name_summary = name_manager.populate_individual_court_names()
+        try:
+            if not name_manager.verify_individual_court_name_column():
+                print("   ❌ Column 'individual_court_name' does not exist. Please run migrations first.")
+                return False
+            name_summary = name_manager.populate_individual_court_names()
+        finally:
+            name_manager.close()
         print(f"   ✅ Assigned names to {name_summary.get('updated_courts', 0)} courts")
         if name_summary.get('clusters_with_names', 0) > 0:
             print(f"   ✅ {name_summary['clusters_with_names']} clusters have named courts")
@@ -206,9 +233,6 @@ def main():
         )
         print()
 
-        # Cleanup
-        matcher.close()
-
         # Final summary
         print("="*60)
         print("✅ PIPELINE COMPLETED SUCCESSFULLY!")
@@ -227,6 +251,12 @@ def main():
         import traceback
         traceback.print_exc()
         return False
+    finally:
+        # Cleanup
+        if matcher is not None:
+            matcher.close()
+        if querier is not None:
+            querier.close()
 
 if __name__ == "__main__":
     success = main()
@@ -7,12 +7,18 @@ import json
 import logging
 import psycopg2
 from typing import Optional, Dict, Any
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import execute_values
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rows per UPDATE statement when writing school matches back to osm_courts_temp
+UPDATE_PAGE_SIZE = 1000
+
+# Rows fetched per round-trip when streaming courts from the server-side cursor
+STREAM_ITERSIZE = 2000
+
 class SchoolChecker:
     """Checks if courts are within school facilities using PostGIS"""
     
@@ -24,7 +30,10 @@ class SchoolChecker:
             connection_string: PostgreSQL connection string
         """
         self.conn = psycopg2.connect(connection_string)
-        self.cursor = self.conn.cursor(cursor_factory=RealDictCursor)
+        self.cursor = self.conn.cursor()
+        # The school lookup runs once per court, so it is PREPAREd on first use
+        # (parsed and planned once per connection) and then EXECUTEd
+        self._lookup_prepared = False
         
         logger.info(json.dumps({
             'event': 'school_checker_initialized'
@@ -42,31 +51,37 @@ class SchoolChecker:
             Format: {'school_id': int, 'school_name': str, 'facility_type': str}
         """
         try:
-            # Query for schools that contain this court geometry
-            # Check both exact containment and centroid containment for flexibility
-            self.cursor.execute("""
-                SELECT 
-                    id,
-                    name,
-                    facility_type,
-                    osm_id
-                FROM osm_facilities
-                WHERE facility_type IN ('school', 'university', 'college')
-                  AND (
-                    ST_Contains(geom, ST_GeomFromText(%s, 4326))
-                    OR ST_Contains(geom, ST_Centroid(ST_GeomFromText(%s, 4326)))
-                  )
-                LIMIT 1;
-            """, (court_geometry_wkt, court_geometry_wkt))
+            if not self._lookup_prepared:
+                # Query for schools that contain this court geometry
+                # Check both exact containment and centroid containment for flexibility
+                self.cursor.execute("""
+                    PREPARE school_lookup(text) AS
+                    SELECT 
+                        id,
+                        name,
+                        facility_type,
+                        osm_id
+                    FROM osm_facilities
+                    WHERE facility_type IN ('school', 'university', 'college')
+                      AND (
+                        ST_Contains(geom, ST_GeomFromText($1, 4326))
+                        OR ST_Contains(geom, ST_Centroid(ST_GeomFromText($1, 4326)))
+                      )
+                    LIMIT 1;
+                """)
+                self._lookup_prepared = True
+            
+            self.cursor.execute("EXECUTE school_lookup(%s);", (court_geometry_wkt,))
             
             result = self.cursor.fetchone()
             
             if result:
+                school_id, school_name, facility_type, school_osm_id = result
                 school_info = {
-                    'school_id': result['id'],
-                    'school_name': result['name'],
-                    'facility_type': result['facility_type'],
-                    'osm_id': result['osm_id']
+                    'school_id': school_id,
+                    'school_name': school_name,
+                    'facility_type': facility_type,
+                    'osm_id': school_osm_id
                 }
                 return school_info
             
@@ -154,54 +169,53 @@ class SchoolChecker:
             Dict with summary statistics
         """
         try:
-            # Get all courts that don't have a facility match or need re-checking
-            self.cursor.execute("""
-                SELECT 
-                    osm_id,
-                    ST_AsText(geom) as geometry_wkt
-                FROM osm_courts_temp
-                WHERE geom IS NOT NULL;
-            """)
-            
-            courts = self.cursor.fetchall()
-            total_courts = len(courts)
+            total_courts = 0
             courts_in_schools = 0
+            school_matches = []
             
-            for court in courts:
-                school_info = self.is_court_within_school(court['geometry_wkt'])
+            # Stream courts through a server-side cursor instead of fetching every WKT
+            # string at once; lookups run on self.cursor while this one stays open
+            with self.conn.cursor(name='school_check_courts') as courts_cursor:
+                courts_cursor.itersize = STREAM_ITERSIZE
+                courts_cursor.execute("""
+                    SELECT 
+                        osm_id,
+                        ST_AsText(geom) as geometry_wkt
+                    FROM osm_courts_temp
+                    WHERE geom IS NOT NULL;
+                """)
                 
-                if school_info:
-                    # Only update if:
-                    # 1. The found school has a name, OR
-                    # 2. The court currently has no facility_name
-                    # This prevents overwriting named facilities with unnamed schools
-                    if school_info['school_name']:
-                        self.cursor.execute("""
-                            UPDATE osm_courts_temp
-                            SET facility_id = %s,
-                                facility_name = %s
-                            WHERE osm_id = %s
-                              AND (facility_id IS NULL OR facility_id != %s);
-                        """, (
+                for court_osm_id, geometry_wkt in courts_cursor:
+                    total_courts += 1
+                    school_info = self.is_court_within_school(geometry_wkt)
+                    
+                    if school_info:
+                        school_matches.append((
+                            court_osm_id,
                             school_info['school_id'],
                             school_info['school_name'],
-                            court['osm_id'],
-                            school_info['school_id']
+                            bool(school_info['school_name'])
                         ))
-                    else:
-                        # Found unnamed school - only update if court has no facility_name
-                        self.cursor.execute("""
-                            UPDATE osm_courts_temp
-                            SET facility_id = %s,
-                                facility_name = %s
-                            WHERE osm_id = %s
-                              AND facility_name IS NULL;
-                        """, (
-                            school_info['school_id'],
-                            school_info['school_name'],
-                            court['osm_id']
-                        ))
-                    courts_in_schools += 1
+                        courts_in_schools += 1
+            
+            # Write all matches back in batched UPDATE ... FROM (VALUES ...) statements.
+            # Only update if:
+            # 1. The found school has a name (and isn't already the court's facility), OR
+            # 2. The court currently has no facility_name
+            # This prevents overwriting named facilities with unnamed schools
+            execute_values(self.cursor, """
+                UPDATE osm_courts_temp c
+                SET facility_id = m.school_id,
+                    facility_name = m.school_name
+                FROM (VALUES %s) AS m(osm_id, school_id, school_name, named)
+                WHERE c.osm_id = m.osm_id
+                  AND CASE
+                        WHEN m.named THEN c.facility_id IS NULL OR c.facility_id != m.school_id
+                        ELSE c.facility_name IS NULL
+                      END;
+            """, school_matches,
+                template="(%s::bigint, %s::integer, %s::varchar, %s::boolean)",
+                page_size=UPDATE_PAGE_SIZE)
             
             self.conn.commit()
             
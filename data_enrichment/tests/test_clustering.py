@@ -0,0 +1,137 @@
+"""
+Tests for CoordinateClusterer court extraction and clustering
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from shapely.geometry import Polygon
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clustering import (
+    EARTH_RADIUS_KM,
+    CoordinateClusterer,
+    CourtClusterData,
+    DisjointSet,
+    neighbor_pairs,
+    polygon_centroids,
+)
+
+
+def _polygon_feature(osm_id, ring, sport='basketball'):
+    return {
+        "type": "Feature",
+        "properties": {"@id": osm_id, "sport": sport},
+        "geometry": {"type": "Polygon", "coordinates": [ring]}
+    }
+
+
+SQUARE = [[-122.4, 37.7], [-122.4, 37.701], [-122.399, 37.701], [-122.399, 37.7], [-122.4, 37.7]]
+
+
+def test_malformed_ring_skips_only_that_feature():
+    clusterer = CoordinateClusterer()
+    features = [
+        _polygon_feature("way/1", SQUARE),
+        _polygon_feature("way/2", [[1], [2], [3], [4]]),
+        _polygon_feature("way/3", [[1, 2], [2, 3]]),
+        _polygon_feature("way/4", [[1, 2], [2], [3, 4], [1, 2]]),
+        _polygon_feature("way/5", SQUARE),
+    ]
+
+    courts = clusterer.extract_court_data(features)
+
+    assert [court.osm_id for court in courts] == ["way/1", "way/5"]
+
+
+def _court(osm_id, lat, lon, sport='basketball'):
+    return CourtClusterData(osm_id=osm_id, lat=lat, lon=lon, sport=sport, hoops=None,
+                            fallback_name=f"{sport} court", feature_index=0, feature_data={})
+
+
+def test_transitive_chain_forms_one_cluster():
+    clusterer = CoordinateClusterer(max_distance_km=0.05)
+    step = np.degrees(0.04 / EARTH_RADIUS_KM)  # 40 m between neighbours, 80 m from end to end
+    courts = [
+        _court("a", 37.7, -122.4),
+        _court("b", 37.7 + step, -122.4),
+        _court("c", 37.7 + 2 * step, -122.4),
+    ]
+
+    clusters = clusterer.cluster_courts(courts)
+
+    assert [[court.osm_id for court in cluster] for cluster in clusters] == [["a", "b", "c"]]
+
+
+def test_chain_does_not_cross_sports():
+    clusterer = CoordinateClusterer(max_distance_km=0.05)
+    step = np.degrees(0.04 / EARTH_RADIUS_KM)
+    courts = [
+        _court("a", 37.7, -122.4),
+        _court("b", 37.7 + step, -122.4, sport='tennis'),
+        _court("c", 37.7 + 2 * step, -122.4),
+    ]
+
+    clusters = clusterer.cluster_courts(courts)
+
+    assert [[court.osm_id for court in cluster] for cluster in clusters] == [["a"], ["b"], ["c"]]
+
+
+def test_disjoint_set_merges_transitively():
+    components = DisjointSet(5)
+    components.union(0, 1)
+    components.union(3, 4)
+    components.union(1, 4)
+
+    roots = [components.find(i) for i in range(5)]
+
+    assert roots[0] == roots[1] == roots[3] == roots[4]
+    assert roots[2] == 2
+    assert components.size[roots[0]] == 4
+
+
+def test_pair_exactly_at_threshold_is_clustered():
+    max_distance_km = 0.05
+    at_threshold = np.degrees(max_distance_km / EARTH_RADIUS_KM)
+
+    i, j = neighbor_pairs(np.array([0.0, at_threshold]), np.array([0.0, 0.0]), max_distance_km)
+    assert list(zip(i.tolist(), j.tolist())) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+
+    i, j = neighbor_pairs(np.array([0.0, at_threshold * 1.001]), np.array([0.0, 0.0]), max_distance_km)
+    assert list(zip(i.tolist(), j.tolist())) == [(0, 0), (1, 1)]
+
+
+def test_polygon_centroids_match_shapely():
+    rings = [
+        [[-122.4, 37.7], [-122.4, 37.701], [-122.399, 37.701], [-122.399, 37.7], [-122.4, 37.7]],
+        # Concave (L-shaped) ring
+        [[0, 0], [4, 0], [4, 1], [1, 1], [1, 3], [0, 3], [0, 0]],
+        # Triangle given as an open ring
+        [[10, 10], [13, 10], [10, 14]],
+    ]
+
+    centroids = polygon_centroids([np.asarray(ring, dtype=np.float64) for ring in rings])
+
+    for ring, centroid in zip(rings, centroids):
+        expected = Polygon(ring).centroid
+        assert centroid == pytest.approx([expected.x, expected.y], abs=1e-9)
+
+
+def test_polygon_centroids_fall_back_to_vertex_mean_for_zero_area_rings():
+    rings = [
+        np.array([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0], [0.0, 0.0]]),  # Collinear
+        np.array([[5.0, 5.0], [5.0, 5.0], [5.0, 5.0], [5.0, 5.0]]),  # Single repeated point
+    ]
+
+    centroids = polygon_centroids(rings)
+
+    assert centroids[0] == pytest.approx([0.75, 0.0])
+    assert centroids[1] == pytest.approx([5.0, 5.0])
+    assert np.isfinite(centroids).all()
+
+
+def test_polygon_centroids_of_no_rings():
+    assert polygon_centroids([]).shape == (0, 2)
@@ -0,0 +1,46 @@
+"""
+Tests for CourtFacilityMatcher logging
+"""
+
+import logging
+import os
+import sys
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_courts_and_facilities import CourtFacilityMatcher
+
+
+def _matcher():
+    """Matcher backed by a mock connection (no database needed)"""
+    with mock.patch('query_courts_and_facilities.psycopg2.connect'):
+        return CourtFacilityMatcher('postgresql://test')
+
+
+def test_log_failures_truncates_warning_and_logs_full_list_at_debug(caplog):
+    matcher = _matcher()
+
+    with caplog.at_level(logging.DEBUG, logger='query_courts_and_facilities'):
+        matcher._log_failures('courts', list(range(25)))
+
+    warning, debug = caplog.records
+    assert warning.levelno == logging.WARNING
+    assert warning.getMessage() == (
+        "Skipped 25 courts that could not be inserted "
+        "(osm_ids: 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, ... (15 more))"
+    )
+    assert debug.levelno == logging.DEBUG
+    assert debug.getMessage() == "All skipped courts osm_ids: " + ', '.join(map(str, range(25)))
+
+
+def test_log_failures_lists_every_id_when_few(caplog):
+    matcher = _matcher()
+
+    with caplog.at_level(logging.WARNING, logger='query_courts_and_facilities'):
+        matcher._log_failures('facilities', [11, 12])
+        matcher._log_failures('facilities', [])
+
+    assert [record.getMessage() for record in caplog.records] == [
+        "Skipped 2 facilities that could not be inserted (osm_ids: 11, 12)"
+    ]
@@ -0,0 +1,169 @@
+"""
+Tests for OverpassQuerier retry, backoff, circuit breaker and cancellation behaviour
+"""
+
+import os
+import sys
+import threading
+import time
+from email.utils import formatdate
+from unittest import mock
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_courts_and_facilities import MAX_RETRY_AFTER, OverpassQuerier
+
+
+def _querier_with_session(session, **kwargs):
+    """Querier whose calling-thread session is the given mock"""
+    querier = OverpassQuerier(**kwargs)
+    querier._thread_local.session = session
+    return querier
+
+
+def test_cancel_stops_query_during_backoff():
+    session = mock.Mock()
+    session.post.side_effect = requests.ConnectionError("connection refused")
+    querier = _querier_with_session(session)
+
+    threading.Timer(0.1, querier.cancel).start()
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="cancelled"):
+        querier._execute_query("[out:json];")
+
+    # The first backoff is ~15-30 seconds; cancel() must cut it short
+    assert time.monotonic() - start < 5
+    assert session.post.call_count == 1
+
+
+def _response(status_code, content=b'{}', headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.url = 'https://example.test/api/interpreter'
+    response.headers.update(headers or {})
+    return response
+
+
+@pytest.mark.parametrize("retry_after, expected", [
+    ("12", 12.0),
+    (" 7 ", 7.0),
+    ("3600", 300.0),  # Capped at MAX_RETRY_AFTER
+])
+def test_retry_after_seconds(retry_after, expected):
+    querier = OverpassQuerier()
+
+    delay = querier._retry_delay(_response(429, headers={'Retry-After': retry_after}), 0, 30)
+
+    assert delay == expected
+
+
+def test_retry_after_http_date():
+    querier = OverpassQuerier()
+
+    retry_at = formatdate(time.time() + 60, usegmt=True)
+    delay = querier._retry_delay(_response(503, headers={'Retry-After': retry_at}), 0, 30)
+
+    assert delay == pytest.approx(60, abs=2)
+
+
+def test_retry_after_http_date_is_capped_and_never_negative():
+    querier = OverpassQuerier()
+
+    far = formatdate(time.time() + 3600, usegmt=True)
+    past = formatdate(time.time() - 3600, usegmt=True)
+
+    assert querier._retry_delay(_response(503, headers={'Retry-After': far}), 0, 30) == MAX_RETRY_AFTER
+    assert querier._retry_delay(_response(503, headers={'Retry-After': past}), 0, 30) == 0.0
+
+
+@pytest.mark.parametrize("headers", [{}, {'Retry-After': 'soon'}, {'Retry-After': '-5'}])
+def test_unusable_retry_after_falls_back_to_jittered_backoff(headers):
+    querier = OverpassQuerier()
+
+    for attempt in range(3):
+        delay = querier._retry_delay(_response(503, headers=headers), attempt, 30)
+        assert 15 * 2 ** attempt <= delay <= 30 * 2 ** attempt
+
+
+def test_breaker_opens_after_threshold_and_fails_over():
+    querier = OverpassQuerier(failure_threshold=2)
+    endpoints = ['https://primary.test', 'https://mirror.test']
+
+    querier._record_failure(endpoints[0])
+    assert querier._select_endpoint(endpoints, 0) == endpoints[0]
+
+    querier._record_failure(endpoints[0])
+    assert querier._select_endpoint(endpoints, 0) == endpoints[1]
+    assert querier._select_endpoint(endpoints, 1) == endpoints[1]
+
+    querier._record_success(endpoints[0])
+    assert querier._select_endpoint(endpoints, 0) == endpoints[0]
+
+
+def test_breaker_raises_when_all_endpoints_are_open():
+    querier = OverpassQuerier(failure_threshold=1)
+    endpoints = ['https://primary.test', 'https://mirror.test']
+
+    for endpoint in endpoints:
+        querier._record_failure(endpoint)
+
+    with pytest.raises(RuntimeError, match="All Overpass endpoints failed"):
+        querier._select_endpoint(endpoints, 0)
+
+
+def test_breaker_closes_after_cooldown():
+    querier = OverpassQuerier(failure_threshold=1, cooldown_seconds=60)
+    endpoints = ['https://primary.test', 'https://mirror.test']
+
+    querier._record_failure(endpoints[0])
+    with mock.patch('query_courts_and_facilities.time.monotonic', return_value=time.monotonic() + 61):
+        assert querier._select_endpoint(endpoints, 0) == endpoints[0]
+
+
+def test_query_skips_endpoint_with_open_circuit(monkeypatch):
+    monkeypatch.delenv('OVERPASS_CACHE_DIR', raising=False)
+    session = mock.Mock()
+    session.post.side_effect = [
+        _response(503, headers={'Retry-After': '0'}),
+        _response(200, b'{"elements": []}'),
+        _response(200, b'{"elements": [1]}'),
+    ]
+    querier = _querier_with_session(session, base_url='https://primary.test', failure_threshold=1,
+                                    max_requests_per_window=10)
+
+    assert querier._execute_query("[out:json];") == {'elements': []}
+    # The primary's circuit is open, so the next query goes straight to the mirror
+    assert querier._execute_query("[out:json];") == {'elements': [1]}
+
+    posted = [call.args[0] for call in session.post.call_args_list]
+    assert posted[0] == 'https://primary.test'
+    assert posted[1] == posted[2] != 'https://primary.test'
+
+
+def test_query_gives_up_when_all_endpoints_are_open(monkeypatch):
+    monkeypatch.delenv('OVERPASS_CACHE_DIR', raising=False)
+    session = mock.Mock()
+    session.post.return_value = _response(503, headers={'Retry-After': '0'})
+    querier = _querier_with_session(session, failure_threshold=1, max_requests_per_window=10)
+
+    with pytest.raises(RuntimeError, match="All Overpass endpoints failed"):
+        querier._execute_query("[out:json];")
+
+    assert session.post.call_count == 2
+
+
+def test_non_retryable_status_is_raised_without_retry(monkeypatch):
+    monkeypatch.delenv('OVERPASS_CACHE_DIR', raising=False)
+    session = mock.Mock()
+    session.post.return_value = _response(400)
+    querier = _querier_with_session(session)
+
+    with pytest.raises(requests.HTTPError):
+        querier._execute_query("[out:json];")
+
+    assert session.post.call_count == 1
+    assert querier._endpoint_failures == {}
@@ -0,0 +1,30 @@
+"""
+Tests for CourtDataValidator coordinate validation
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from validation import CourtDataValidator, ValidationLevel
+
+
+def test_malformed_ring_reports_invalid_coordinate_format():
+    validator = CourtDataValidator()
+
+    result = validator.validate_coordinates([[[1], [2, 3], [4, 5], [1]]])
+
+    assert not result.is_valid
+    assert result.level == ValidationLevel.ERROR
+    assert result.message == "Invalid coordinate format at position 0: [1]"
+
+
+def test_ring_differing_only_in_altitude_is_not_closed():
+    validator = CourtDataValidator()
+
+    ring = [[-122.4, 37.7, 0], [-122.4, 37.701], [-122.399, 37.701], [-122.4, 37.7, 5]]
+    result = validator.validate_coordinates([ring])
+
+    assert not result.is_valid
+    assert result.level == ValidationLevel.WARNING
@@ -13,6 +13,9 @@ from enum import Enum
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sports accepted in court properties (frozenset for constant-time membership checks)
+VALID_SPORTS = frozenset(['basketball', 'tennis', 'soccer', 'volleyball', 'handball', 'pickleball', 'other'])
+
 class ValidationError(Exception):
     """Custom exception for validation errors"""
     pass
@@ -243,11 +246,10 @@ class CourtDataValidator:
         # Validate sport
         if 'sport' in properties:
             sport = properties['sport']
-            valid_sports = ['basketball', 'tennis', 'soccer', 'volleyball', 'handball', 'pickleball', 'other']
-            if sport not in valid_sports:
+            if sport not in VALID_SPORTS:
                 results.append(ValidationResult(
                     False, ValidationLevel.ERROR,
-                    f"Invalid sport: {sport}. Must be one of {valid_sports}",
+                    f"Invalid sport: {sport}. Must be one of {sorted(VALID_SPORTS)}",
                     field='sport'
                 ))
         
@@ -276,8 +278,10 @@ class CourtDataValidator:
         """Validate business logic rules"""
         results = []
         
+        hoops = properties.get('hoops')
+        
         # Basketball courts should have hoops
-        if properties.get('sport') == 'basketball' and not properties.get('hoops'):
+        if properties.get('sport') == 'basketball' and not hoops:
             results.append(ValidationResult(
                 False, ValidationLevel.WARNING,
                 "Basketball courts should have hoops count specified",
@@ -285,13 +289,13 @@ class CourtDataValidator:
             ))
         
         # Check for reasonable hoops count
-        if properties.get('hoops'):
+        if hoops:
             try:
-                hoops_int = int(properties['hoops']) if isinstance(properties['hoops'], str) else properties['hoops']
+                hoops_int = int(hoops) if isinstance(hoops, str) else hoops
                 if hoops_int > 10:
                     results.append(ValidationResult(
                         False, ValidationLevel.WARNING,
-                        f"Unusually high hoops count: {properties['hoops']}",
+                        f"Unusually high hoops count: {hoops}",
                         field='hoops'
                     ))
             except (ValueError, TypeError):
@@ -355,15 +359,17 @@ class CourtDataValidator:
             photon_results = self.validate_photon_data(photon_data)
             all_results.extend(photon_results)
         
-        # Check if any errors exist
-        has_errors = any(result.level == ValidationLevel.ERROR for result in all_results)
-        
-        # Categorize results
-        self.errors = [r for r in all_results if r.level == ValidationLevel.ERROR]
-        self.warnings = [r for r in all_results if r.level == ValidationLevel.WARNING]
-        self.info = [r for r in all_results if r.level == ValidationLevel.INFO]
+        # Categorize results in a single pass
+        self.errors, self.warnings, self.info = [], [], []
+        by_level = {
+            ValidationLevel.ERROR: self.errors,
+            ValidationLevel.WARNING: self.warnings,
+            ValidationLevel.INFO: self.info,
+        }
+        for result in all_results:
+            by_level[result.level].append(result)
         
-        return not has_errors, all_results
+        return not self.errors, all_results
     
     def get_validation_summary(self) -> Dict[str, Any]:
         """Get summary of validation results"""
@@ -379,16 +385,16 @@ class CourtDataValidator:
     
     def log_validation_results(self, osm_id: str):
         """Log validation results for a specific court"""
-        summary = self.get_validation_summary()
-        
-        logger.info(json.dumps({
-            'event': 'validation_completed',
-            'osm_id': osm_id,
-            'is_valid': summary['is_valid'],
-            'errors': summary['errors'],
-            'warnings': summary['warnings'],
-            'info': summary['info']
-        }))
+        # Called once per court: skip building the summary when INFO is filtered out
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'event': 'validation_completed',
+                'osm_id': osm_id,
+                'is_valid': len(self.errors) == 0,
+                'errors': len(self.errors),
+                'warnings': len(self.warnings),
+                'info': len(self.info)
+            }))
         
         # Log individual errors
         for error in self.errors: